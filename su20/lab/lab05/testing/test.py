@@ -9,9 +9,11 @@ import signal
 import re
 import sys
 import shutil
+import argparse
 
 file_locations = os.getcwd()
 logisim_location = os.path.join(os.getcwd(),"logisim-evolution.jar")
+tools_location = os.path.join(os.path.dirname(os.path.realpath(__file__)),"../../../tools")
 
 class TestCase():
   """
@@ -23,7 +25,10 @@ class TestCase():
     self.tracefile = tracefile
     self.register_doc = register_doc
 
-  def __call__(self, filename):
+  def __call__(self, filename, servers=None):
+    server = servers.get() if servers is not None else None
+    if server is not None:
+      return self.run_on_server(filename, servers, server)
     output = tempfile.TemporaryFile(mode='r+')
     try:
       stdinf = open('/dev/null')
@@ -46,6 +51,21 @@ class TestCase():
     else:
       return (False, "Did not match expected output")
 
+  def run_on_server(self, filename, servers, server):
+    try:
+      output = server.run(self.circfile)
+      try:
+        reference = open(self.tracefile)
+        passed = compare_unbounded(output, reference, filename)
+      finally:
+        output.close()
+    finally:
+      servers.put(server)
+    if passed:
+      return (True, "Matched expected output")
+    else:
+      return (False, "Did not match expected output")
+
 def compare_unbounded(student_out, reference_out, filename):
   passed = True
   student_output_array = []
@@ -64,13 +84,13 @@ def compare_unbounded(student_out, reference_out, filename):
   return passed
 
 
-def run_tests(tests):
+def run_tests(tests, servers=None):
   print("Testing files...")
   tests_passed = 0
   tests_failed = 0
 
   for description,filename,test in tests:
-    test_passed, reason = test(filename)
+    test_passed, reason = test(filename, servers)
     if test_passed:
       print("\tPASSED test: %s" % description)
       tests_passed += 1
@@ -94,4 +114,18 @@ tests = [
 ]
 
 if __name__ == '__main__':
-  run_tests(tests)
+  parser = argparse.ArgumentParser(description="Run the lab 5 Logisim tests")
+  parser.add_argument("--batch", action="store_true", help="Run every circuit in one resident Logisim JVM instead of starting Logisim for each")
+  args = parser.parse_args()
+
+  servers = None
+  if args.batch:
+    # Only --batch needs the shared tools, so the tests run without them otherwise
+    sys.path.insert(0, tools_location)
+    from logisim_server import LogisimServerPool
+    servers = LogisimServerPool(logisim_location, 1)
+  try:
+    run_tests(tests, servers)
+  finally:
+    if servers is not None:
+      servers.close()
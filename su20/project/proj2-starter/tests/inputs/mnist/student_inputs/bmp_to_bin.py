@@ -1,71 +1,88 @@
-import sys
+import os
+import glob
+import struct
+import argparse
 
 ## Takes in one argument, a string, and reads in <arg>.bmp to write out <arg>.bin
 ## For example, `python bmp_to_bin.py five` reads in five.bmp and outputs five.bin
+## With --dir, converts every .bmp in a directory, e.g. `python bmp_to_bin.py --dir drawings`
 
-## Read in .bmp file and skip past BMP header
-infile = open(sys.argv[1] + ".bmp", "rb")
-infile.seek(54)
+WHITE = b"\xff\xff\xff"
 
-## Write appropriate header (784 1) to binary file
-index = 0
-outfile = open(sys.argv[1] + ".bin", "wb+")
-header_arr = [16, 3, 0, 0, 1, 0, 0, 0]
-byte_header = bytearray(header_arr)
-outfile.write(byte_header)
+## Translation tables from thresholded pixels to matrix values and to ASCII art
+MATRIX_VALUES = bytes(0 if p == 0xff else 128 for p in range(256))
+ASCII_ART = bytes(ord(" ") if p == 0xff else ord("*") for p in range(256))
 
-## Read in BMP file, differentiating between white pixels (r = g = b = 0xff) and non-white pixels
-ff_byte = '0xFF'
-ff_ba = bytearray([int(ff_byte, 16)])
-toprint = ""
-line = []
-all_lines = []
-while index < 784:
-    r = infile.read(1)
-    b = infile.read(1)
-    g = infile.read(1)
-    if (r == ff_ba and b == ff_ba and g == ff_ba):
-        line.append(" ")
-    else: 
-        line.append("*")
-    index = index + 1
-    if (index % 28 == 0):
-        all_lines.append(line)
-        line = []
+## Parse the BMP header, returning the width, height and rows of pixel data from top to bottom
+def read_bmp(path):
+    with open(path, "rb") as infile:
+        data = infile.read()
+    if data[:2] != b"BM":
+        raise ValueError("{} is not a BMP file".format(path))
+    pixel_offset = struct.unpack_from("<I", data, 10)[0]
+    width, height, _, bits_per_pixel, compression = struct.unpack_from("<iiHHI", data, 18)
+    if bits_per_pixel not in (24, 32) or compression not in (0, 3):
+        raise ValueError("{} must be an uncompressed 24 or 32 bit BMP".format(path))
 
-## Flip the image to the correct orientation
-final_lines = []
-final_arr = []
-for i in range(28):
-    final_lines.append([])
-    final_arr.append([])
-    for j in range(28):
-        final_arr[i].append([])
+    ## Rows are padded to a multiple of 4 bytes, and stored bottom-up unless the height is negative
+    pixel_size = bits_per_pixel // 8
+    stride = (width * pixel_size + 3) & ~3
+    rows = [data[pixel_offset + i * stride:pixel_offset + i * stride + width * pixel_size] for i in range(abs(height))]
+    if height > 0:
+        rows.reverse()
+    return width, abs(height), pixel_size, rows
 
-bytes128 = bytearray([128, 0, 0, 0])
-bytes0 = bytearray([0, 0, 0, 0])
-for i in range(28):
-    index = 27
-    line_str = ""
-    while (index >= 0): 
-        line_str = all_lines[i][index] + line_str
-        index = index - 1
-        final_arr[28 - i - 1][index] = all_lines[i][index]
-    final_lines[28 - i - 1] = line_str
+## Differentiate between white pixels (r = g = b = 0xff) and non-white pixels, returning one byte
+## per pixel that is 0xff only for white ones. The channels of the whole image are ANDed at once as
+## big integers.
+def threshold(rows, pixel_size):
+    data = b"".join(rows)
+    num_pixels = len(data) // pixel_size
+    r, g, b = (int.from_bytes(data[i::pixel_size], "little") for i in range(3))
+    return (r & g & b).to_bytes(num_pixels, "little")
 
-## Print the image read in as ASCII art
-for line in final_lines:
-    print(line)
+def bmp_to_bin(bmp_path, bin_path, show=False):
+    width, height, pixel_size, rows = read_bmp(bmp_path)
+    pixels = threshold(rows, pixel_size)
 
+    ## Print the image read in as ASCII art
+    if show:
+        art = pixels.translate(ASCII_ART).decode("ascii")
+        for i in range(height):
+            print(art[i * width:(i + 1) * width])
 
-## Write the binary image to the .bin file
-for i in range(28):
-    for j in range(28):
-       if final_arr[i][j] == "*":
-           outfile.write(bytes128)
-       else:
-           outfile.write(bytes0)    
+    ## Write the (width * height) x 1 matrix in one go, 128 for non-white pixels and 0 for white ones.
+    ## Each value fits in the low byte of its little-endian int, so the rest stay zero.
+    out = bytearray(4 * width * height)
+    out[0::4] = pixels.translate(MATRIX_VALUES)
+    with open(bin_path, "wb") as outfile:
+        outfile.write(struct.pack("<ii", width * height, 1))
+        outfile.write(out)
 
-## Close input and output files
-infile.close()
-outfile.close()    
+def main():
+    parser = argparse.ArgumentParser(description="Converts BMP images of digits into binary MNIST inputs")
+    parser.add_argument("name", nargs="?", help="reads <name>.bmp and writes <name>.bin")
+    parser.add_argument("--dir", help="convert every .bmp in this directory instead")
+    parser.add_argument("--out", help="directory to write the .bin files to with --dir (default: next to the .bmp files)")
+    args = parser.parse_args()
+
+    if args.dir is None:
+        if args.name is None:
+            parser.error("Either a name or --dir must be given")
+        bmp_to_bin(args.name + ".bmp", args.name + ".bin", show=True)
+        return
+
+    out_dir = args.out or args.dir
+    os.makedirs(out_dir, exist_ok=True)
+    converted = 0
+    for bmp_path in sorted(glob.glob(os.path.join(args.dir, "*.bmp"))):
+        name = os.path.splitext(os.path.basename(bmp_path))[0]
+        try:
+            bmp_to_bin(bmp_path, os.path.join(out_dir, name + ".bin"))
+            converted += 1
+        except (OSError, ValueError, struct.error) as e:
+            print("Could not convert {}: {}".format(bmp_path, e))
+    print("Converted {} images".format(converted))
+
+if __name__ == "__main__":
+    main()
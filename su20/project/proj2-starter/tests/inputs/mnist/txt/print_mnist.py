@@ -1,31 +1,74 @@
+import os
+import re
 import sys
+import argparse
 
-## This program takes one command line argument, a number, e.g. "5"
-## It will look at "mnist_input<number>.txt", e.g. "mnist_input5.txt"
-
-## Open the .txt version of the input file and add all lines to an array
-file = open("inputs/mnist_input" + sys.argv[1] + ".txt", "r")
-lines = []
-for line in file:
-    lines.append(line)
-
-index = 0
-toprint = ""
-
-## Print a * if line is nonzero, and a space if it is 0, with a newline every 28 lines
-while index < 784:
-    if "0" in lines[index + 1]:
-        toprint = toprint + " "
-    else:
-        toprint = toprint + "*"
-    index = index + 1
-    if index % 28 == 0:
-        toprint = toprint + "\n"
-
-## Check what this input file is classified as
-classified_as = open("./labels/label" + sys.argv[1] + ".txt", "r")
-number_classified = str(classified_as.read())
-
-## Print the image as ASCII art
-print("\n\nThis is the MNIST input image: \n\n" + toprint +
-        "\n\nThe classifier matches it to the number " + number_classified)
\ No newline at end of file
+## This program takes the numbers of one or more MNIST inputs, e.g. "5", "0-8" or "--all"
+## For each number it will look at "mnist_input<number>.txt", e.g. "mnist_input5.txt",
+## or with --bin at "../bin/inputs/mnist_input<number>.bin"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../../tools"))
+from binmatrix import BinMatrix
+
+TXT_INPUT = "inputs/mnist_input{}.txt"
+BIN_INPUT = "../bin/inputs/mnist_input{}.bin"
+LABEL = "./labels/label{}.txt"
+
+## Read the 784 pixel values of an input, as the strings they are written as in the .txt files
+def read_txt(number):
+    with open(TXT_INPUT.format(number), "r") as file:
+        lines = file.read().split("\n")
+    return lines[1:785]
+
+def read_bin(number):
+    with BinMatrix(BIN_INPUT.format(number)) as matrix:
+        return [str(value) for value in matrix.data()[:784]]
+
+## Print a * if the pixel is nonzero, and a space if it is 0, with a newline every 28 pixels
+## (like the original script, any value containing a "0" digit counts as 0)
+def render(pixels):
+    chars = []
+    for index, pixel in enumerate(pixels):
+        chars.append(" " if "0" in pixel else "*")
+        if (index + 1) % 28 == 0:
+            chars.append("\n")
+    return "".join(chars)
+
+def parse_numbers(args, use_bin):
+    if args.all:
+        pattern = BIN_INPUT if use_bin else TXT_INPUT
+        directory = os.path.dirname(pattern)
+        regex = re.compile(re.escape(os.path.basename(pattern)).replace(r"\{\}", r"(\d+)") + "$")
+        matches = [regex.match(name) for name in os.listdir(directory)]
+        return sorted(int(m.group(1)) for m in matches if m)
+    numbers = []
+    for arg in args.numbers:
+        if "-" in arg:
+            first, last = arg.split("-")
+            numbers += range(int(first), int(last) + 1)
+        else:
+            numbers.append(int(arg))
+    return numbers
+
+def main():
+    parser = argparse.ArgumentParser(description="Prints MNIST inputs as ASCII art")
+    parser.add_argument("numbers", nargs="*", help="input numbers to print, e.g. 5 or 0-8")
+    parser.add_argument("--all", action="store_true", default=False, help="print every input")
+    parser.add_argument("--bin", action="store_true", default=False, help="read the binary inputs instead of the .txt ones")
+    args = parser.parse_args()
+    if not args.numbers and not args.all:
+        parser.error("Give at least one input number, or --all")
+
+    for number in parse_numbers(args, args.bin):
+        pixels = read_bin(number) if args.bin else read_txt(number)
+
+        ## Check what this input file is classified as
+        with open(LABEL.format(number), "r") as classified_as:
+            number_classified = str(classified_as.read())
+
+        ## Print the image as ASCII art
+        sys.stdout.write("\n\nThis is the MNIST input image: \n\n" + render(pixels) +
+                "\n\nThe classifier matches it to the number " + number_classified + "\n")
+
+if __name__ == "__main__":
+    main()
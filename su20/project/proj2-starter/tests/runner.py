@@ -1,44 +1,301 @@
 import os
+import io
+import sys
+import re
 import json
+import time
+import hashlib
+import argparse
+import itertools
+import threading
 import subprocess
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 dirname = os.path.dirname(__file__)
 dirname = Path(dirname).resolve()
 VENUS_PATH = "../tools/venus.jar"
 VENUS_PATH = os.path.join(dirname, VENUS_PATH)
+TOOLS_PATH = "../tools"
+TOOLS_PATH = os.path.join(dirname, TOOLS_PATH)
+sys.path.insert(0, TOOLS_PATH)
+from binmatrix import BinMatrix, HEADER_SIZE, ELEMENT_SIZE
+VENUS_SERVER_PATH = "../tools/VenusServer.java"
+VENUS_SERVER_PATH = os.path.join(dirname, VENUS_SERVER_PATH)
+CACHE_PATH = ".runner_cache.json"
+CACHE_PATH = os.path.join(dirname, CACHE_PATH)
+
+IMPORT_PATTERN = re.compile(r"^\s*\.import\s+(\S+)", re.MULTILINE)
+STRING_PATTERN = re.compile(r'"([^"\n]*)"')
 
 class FileCompare:
+    BLOCK_SIZE = 1 << 16
+    WINDOW = 16
+
     def __init__(self, reference, student):
         self.reference = reference
         self.student = student
-    
-    def compare(self) -> bool:
+
+    def compare(self, printf=print) -> bool:
         if not os.path.isfile(self.reference):
-            print(f"Could not find the reference file {self.reference}!")
+            printf(f"Could not find the reference file {self.reference}!")
             return False
         if not os.path.isfile(self.student):
-            print(f"Could not find the student output file {self.student}!")
+            printf(f"Could not find the student output file {self.student}!")
+            return False
+        ref_size = os.path.getsize(self.reference)
+        std_size = os.path.getsize(self.student)
+        if ref_size != std_size:
+            printf("~" * 20)
+            printf(f"The student and reference files differed in size!")
+            printf("~" * 20)
+            printf(f"Reference ({self.reference}): {ref_size} bytes")
+            printf(f"Actual ({self.student}): {std_size} bytes")
             return False
         with open(self.reference, "rb") as r:
             with open(self.student, "rb") as s:
-                ref = r.read()
-                std = s.read()
-                if ref == std:
+                offset = self.first_difference(r, s)
+                if offset is None:
                     return True
-                else:
-                    print("~" * 20)
-                    print(f"The student and reference files differed!")
-                    print("~" * 20)
-                    print(f"Reference ({self.reference}):")
-                    print(ref.hex())
-                    print(f"Actual ({self.student}):")
-                    print(std.hex())
-                    return False
+                printf("~" * 20)
+                printf(f"The student and reference files differed!")
+                printf("~" * 20)
+                printf(f"First difference at byte {offset}{self.describe_offset(self.reference, offset)}")
+                start = max(0, offset - self.WINDOW // 2) & ~3
+                printf(f"Reference ({self.reference}) from byte {start}:")
+                printf(self.window(r, start))
+                printf(f"Actual ({self.student}) from byte {start}:")
+                printf(self.window(s, start))
+                return False
+
+    def first_difference(self, r, s) -> int:
+        offset = 0
+        while True:
+            ref = r.read(self.BLOCK_SIZE)
+            std = s.read(self.BLOCK_SIZE)
+            if ref != std:
+                return offset + next(i for i, (a, b) in enumerate(zip(ref, std)) if a != b)
+            if not ref:
+                return None
+            offset += len(ref)
+
+    def window(self, f, start: int) -> str:
+        f.seek(start)
+        return f.read(self.WINDOW).hex(" ", 4)
+
+    @staticmethod
+    def describe_offset(path: str, offset: int) -> str:
+        try:
+            matrix = BinMatrix(path)
+        except ValueError:
+            return ""
+        with matrix:
+            if matrix.nbytes != os.path.getsize(path) or matrix.cols == 0:
+                return ""
+            if offset < HEADER_SIZE:
+                return f" (the {'rows' if offset < 4 else 'cols'} field of the header)"
+            element = (offset - HEADER_SIZE) // ELEMENT_SIZE
+            return f" (element at row {element // matrix.cols}, col {element % matrix.cols} of a {matrix.rows}x{matrix.cols} matrix)"
+
+JAVA_VERSION_PATTERN = re.compile(r'version "(\d+)(?:\.(\d+))?')
+java_flags = None
+java_flags_lock = threading.Lock()
+
+def java_major_version() -> int:
+    """Returns the major version of the java on PATH (8 for "1.8.0"), or None if it cannot tell."""
+    try:
+        proc = subprocess.run(["java", "-version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = JAVA_VERSION_PATTERN.search(proc.stdout)
+    if match is None:
+        return None
+    major = int(match.group(1))
+    if major == 1 and match.group(2) is not None:
+        major = int(match.group(2))
+    return major
+
+def venus_server_java_flags() -> [str]:
+    """
+    Returns the flags the VenusServer JVM needs to install its SecurityManager. Only JDK 17 to 23
+    need (and accept) -Djava.security.manager=allow; JDK 11 fails to start with it.
+    """
+    global java_flags
+    with java_flags_lock:
+        if java_flags is None:
+            version = java_major_version()
+            if version is None:
+                print("Could not tell the Java version from `java -version`, so the Venus server starts without -Djava.security.manager=allow")
+            elif version < 17:
+                print(f"Java {version} does not take -Djava.security.manager=allow, so the Venus server starts without it")
+            java_flags = ["-Djava.security.manager=allow"] if version is not None and 17 <= version < 24 else []
+        return java_flags
+
+class VenusServerUnavailable(Exception):
+    """Raised when a VenusServer cannot start, e.g. on a JDK without SecurityManager support."""
+
+class VenusServer:
+    """A resident JVM which runs Venus on request (see tools/VenusServer.java)."""
+    def __init__(self, venus_path=VENUS_PATH, server_path=VENUS_SERVER_PATH):
+        self.venus_path = venus_path
+        self.server_path = server_path
+        self.proc = None
+
+    def start(self):
+        try:
+            self.proc = subprocess.Popen(["java"] + venus_server_java_flags() + [self.server_path, self.venus_path], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            raise VenusServerUnavailable(str(e))
+        line = self.proc.stdout.readline().decode(errors="replace").strip()
+        if line != "ready":
+            self.stop()
+            raise VenusServerUnavailable(line[len("unavailable "):] if line.startswith("unavailable ") else "the JVM exited while starting")
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def run(self, args: [str], timeout: float) -> (str, str, int):
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        request = f"{len(args)}\n" + "".join(f"{arg}\n" for arg in args)
+        # A hung program would block the read below forever, so kill the JVM once the timeout is up.
+        proc = self.proc
+        timed_out = threading.Event()
+        def kill():
+            timed_out.set()
+            proc.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            self.proc.stdin.write(request.encode())
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().split()
+            if len(header) != 3:
+                raise BrokenPipeError
+            exitcode, out_len, err_len = (int(h) for h in header)
+            out = self.proc.stdout.read(out_len)
+            err = self.proc.stdout.read(err_len)
+        except (BrokenPipeError, ValueError):
+            self.stop()
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(args, timeout)
+            raise RuntimeError("The Venus server exited unexpectedly!")
+        finally:
+            timer.cancel()
+        decode = lambda b: b.decode().replace("\r\n", "\n")
+        return decode(out), decode(err), exitcode
+
+class VenusServerPool:
+    """
+    Hands out one VenusServer per concurrently running test. If servers cannot start on this
+    machine, run says why once and then raises VenusServerUnavailable, and tests should start
+    Venus themselves.
+    """
+    def __init__(self, size: int):
+        self.servers = Queue()
+        for _ in range(size):
+            self.servers.put(VenusServer())
+        self.unavailable = False
+        self.lock = threading.Lock()
+
+    def run(self, args: [str], timeout: float) -> (str, str, int):
+        if self.unavailable:
+            raise VenusServerUnavailable()
+        server = self.servers.get()
+        try:
+            return server.run(args, timeout)
+        except VenusServerUnavailable as e:
+            with self.lock:
+                if not self.unavailable:
+                    self.unavailable = True
+                    print(f"Could not start a resident Venus JVM ({e}), so each test will start Venus instead")
+            raise
+        finally:
+            self.servers.put(server)
+
+    def close(self):
+        while not self.servers.empty():
+            self.servers.get().stop()
+
+class ResultCache:
+    """Remembers which test inputs have already passed, keyed by a hash of everything the result depends on."""
+    MAX_ENTRIES = 1024
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.digests = {}
+        self.entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"Ignoring unreadable test cache {path}!")
+
+    def file_digest(self, path: str) -> str:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "missing"
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            cached = self.digests.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                h.update(block)
+        with self.lock:
+            self.digests[path] = (stamp, h.hexdigest())
+        return h.hexdigest()
+
+    def hit(self, key: str) -> bool:
+        with self.lock:
+            if key not in self.entries:
+                return False
+            self.entries[key]["used"] = time.time()
+            return True
+
+    def add(self, key: str, test_id: str):
+        with self.lock:
+            self.entries[key] = {"id": test_id, "used": time.time()}
+
+    def save(self):
+        # Keep only the most recently used entries.
+        with self.lock:
+            entries = sorted(self.entries.items(), key=lambda e: e[1]["used"], reverse=True)
+            self.entries = dict(entries[:self.max_entries])
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f, indent=1)
+
+def assembly_closure(path: str) -> [str]:
+    """Returns path and every file it transitively .imports."""
+    seen = []
+    todo = [os.path.normpath(path)]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "r") as f:
+            for imp in IMPORT_PATTERN.findall(f.read()):
+                todo.append(os.path.normpath(os.path.join(os.path.dirname(path), imp)))
+    return seen
 
 class TestCase:
     VENUS_PATH = VENUS_PATH
-    TEST_COUNTER = 1
+    VENUS_SERVERS = None
+    RESULT_CACHE = None
+    TEST_COUNTER = itertools.count(1)
     def __init__(self, name, test_file, id, args=[], stdout="", stderr="", exitcode=0, cwd=None, timeout=10, compare_files=[], printf=print):
         self.name = name
         self.test_file = test_file
@@ -52,19 +309,23 @@ class TestCase:
         self.compare_files = [FileCompare(**cf) for cf in compare_files]
         self.printf = printf
 
-    def run(self, test_file_path: str):
+    def run(self, test_file_path: str, number: int = None):
         try:
+            if number is None:
+                number = next(TestCase.TEST_COUNTER)
             self.printf("*" * 40)
-            self.TEST_COUNTER
-            self.printf(f"[{self.TEST_COUNTER}] ({self.id}) Running {self.name}...")
-            self.TEST_COUNTER += 1
+            self.printf(f"[{number}] ({self.id}) Running {self.name}...")
             self.printf("*" * 40)
             filepath = os.path.join(test_file_path, self.test_file)
-            p = subprocess.Popen(["java", "-jar", self.VENUS_PATH, filepath] + self.args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.cwd, universal_newlines = True, bufsize=100)
+            key = None
+            if self.RESULT_CACHE is not None:
+                key = self.cache_key(filepath)
+                if self.RESULT_CACHE.hit(key):
+                    self.print_end("PASSED (cached)")
+                    return True
             try:
-                out, err = p.communicate(timeout = self.timeout)
+                out, err, returncode = self.execute([filepath] + self.args)
             except subprocess.TimeoutExpired:
-                p.kill()
                 self.printf("The test timed out testing your RISC-V function!")
                 self.print_end("TIMEOUT")
                 return False
@@ -95,15 +356,17 @@ class TestCase:
                 self.printf(err)
                 self.printf("-" * 20)
                 passing = False
-            if p.returncode != self.exitcode and self.exitcode is not None:
+            if returncode != self.exitcode and self.exitcode is not None:
                 self.printf("~" * 20)
                 self.printf("Return code MISMATCH")
                 self.printf("~" * 20)
-                self.printf(f"Expected: {self.exitcode}, Actual: {p.returncode}")
+                self.printf(f"Expected: {self.exitcode}, Actual: {returncode}")
                 passing = False
             for cf in self.compare_files:
-                passing = cf.compare() and passing
+                passing = cf.compare(self.printf) and passing
             if passing:
+                if key is not None:
+                    self.RESULT_CACHE.add(key, self.id)
                 self.print_end("PASSED")
                 return True
             else:   
@@ -114,6 +377,44 @@ class TestCase:
             self.print_end("ERRORED")
             return False
 
+    def cache_key(self, filepath: str) -> str:
+        cwd = self.cwd or "."
+        student_files = {os.path.normpath(os.path.join(cwd, cf.student)) for cf in self.compare_files}
+        sources = assembly_closure(filepath)
+        files = [self.VENUS_PATH] + sources
+        # Input files can be passed as arguments or hardcoded as strings in the assembly.
+        candidates = list(self.args)
+        for source in sources:
+            if os.path.isfile(source):
+                with open(source, "r") as f:
+                    candidates += STRING_PATTERN.findall(f.read())
+        for candidate in candidates:
+            path = os.path.normpath(os.path.join(cwd, candidate))
+            if path not in student_files and os.path.isfile(path):
+                files.append(path)
+        files += [os.path.join(cwd, cf.reference) for cf in self.compare_files]
+
+        h = hashlib.sha256()
+        h.update(json.dumps([self.test_file, self.args, self.stdout, self.stderr, self.exitcode, self.cwd]).encode())
+        for f in files:
+            h.update(f"{f}:{self.RESULT_CACHE.file_digest(f)}\n".encode())
+        return h.hexdigest()
+
+    def execute(self, args: [str]) -> (str, str, int):
+        # The resident servers all share our working directory, so tests with their own cwd need a fresh JVM.
+        if self.VENUS_SERVERS is not None and self.cwd is None:
+            try:
+                return self.VENUS_SERVERS.run(args, self.timeout)
+            except VenusServerUnavailable:
+                pass
+        p = subprocess.Popen(["java", "-jar", self.VENUS_PATH] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.cwd, universal_newlines = True, bufsize=100)
+        try:
+            out, err = p.communicate(timeout = self.timeout)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            raise
+        return out, err, p.returncode
+
     def print_end(self, msg):
         self.printf("-" * 40)
         self.printf(msg)
@@ -152,20 +453,52 @@ def load_tests(path):
                 traceback.print_exc()
     return tests
 
+def run_buffered(test: TestCase, test_file_path: str, number: int) -> (bool, str):
+    # Collect everything the test prints so that concurrent tests don't interleave.
+    buf = io.StringIO()
+    test.printf = lambda *a, **kw: print(*a, file=buf, **kw)
+    result = test.run(test_file_path, number)
+    return result, buf.getvalue()
+
+def run_tests(tests: [TestCase], test_file_path: str, jobs: int = 1) -> int:
+    if jobs <= 1:
+        return sum(1 for number, test in enumerate(tests, 1) if test.run(test_file_path, number))
+    passed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_buffered, test, test_file_path, number) for number, test in enumerate(tests, 1)]
+        # Print in submission order so the output is the same regardless of scheduling.
+        for future in futures:
+            result, output = future.result()
+            print(output, end="")
+            if result:
+                passed += 1
+    return passed
+
 def main(args):
+    parser = argparse.ArgumentParser(description="Runs the Venus test cases in test_cases/")
+    parser.add_argument("ids", nargs="*", help="only run the tests with these ids")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of tests to run concurrently")
+    parser.add_argument("--server", action="store_true", default=False, help="run tests in resident Venus JVMs instead of starting one per test")
+    parser.add_argument("--no-cache", action="store_true", default=False, help="rerun tests even if their inputs have not changed since they last passed")
+    args = parser.parse_args(args)
+    if not args.no_cache:
+        TestCase.RESULT_CACHE = ResultCache()
+    if args.server:
+        TestCase.VENUS_SERVERS = VenusServerPool(max(args.jobs, 1))
+
     tests = sorted(load_tests("test_cases"), key=lambda tc: tc.id)
-    passed = 0
-    ran = 0
-    for test in tests:
-        if len(args) > 1 and test.id not in args:
-            continue
-        ran += 1
-        if test.run("assembly"):
-            passed += 1
+    if args.ids:
+        tests = [test for test in tests if test.id in args.ids]
+    try:
+        passed = run_tests(tests, "assembly", args.jobs)
+    finally:
+        if TestCase.VENUS_SERVERS is not None:
+            TestCase.VENUS_SERVERS.close()
+        if TestCase.RESULT_CACHE is not None:
+            TestCase.RESULT_CACHE.save()
     print("\n" + ("=" * 40))
-    print(f"Passed {passed} / {ran} tests!")
+    print(f"Passed {passed} / {len(tests)} tests!")
     print("=" * 40)
 
 if __name__ == "__main__":
-    import sys
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file
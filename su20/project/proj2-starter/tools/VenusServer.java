@@ -0,0 +1,159 @@
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+
+/**
+ * Keeps one JVM alive and runs Venus on request, so that tests/runner.py only
+ * pays for JVM start-up once per worker instead of once per test.
+ *
+ * Usage: java [-Djava.security.manager=allow] VenusServer.java venus.jar [main class]
+ * The flag lets JDK 17 to 23 install a SecurityManager, while JDK 11 and
+ * earlier fail to start with it, so tests/runner.py only passes it to those.
+ *
+ * Once it is ready, the server prints "ready". It needs a SecurityManager to
+ * stop Venus's System.exit, which JDK 24 and later no longer allow; there it
+ * prints "unavailable <reason>" and exits instead, and tests/runner.py goes
+ * back to starting Venus for every test.
+ *
+ * Requests are read from stdin and answered on stdout, one at a time:
+ *   request:  <argc>\n<arg 1>\n...<arg argc>\n
+ *   response: <exit code> <stdout length> <stderr length>\n<stdout bytes><stderr bytes>
+ * Since stdin carries the requests, Venus itself reads from an empty stdin.
+ *
+ * Every request loads the main class's package (venus.*) through a fresh
+ * class loader so that no simulator state leaks from one test into the next.
+ * The libraries bundled in the jar, such as the Kotlin runtime, are loaded
+ * once and shared by every request, so that they stay loaded and compiled.
+ */
+public class VenusServer {
+    private static class ExitException extends SecurityException {
+        final int status;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    /**
+     * Loads the classes whose names start with `prefix` itself, and leaves
+     * every other class to the shared loader it is given.
+     */
+    private static class ReloadingClassLoader extends URLClassLoader {
+        private final String prefix;
+
+        ReloadingClassLoader(URL jar, String prefix, ClassLoader shared) {
+            super(new URL[] {jar}, shared);
+            this.prefix = prefix;
+        }
+
+        @Override
+        protected Class<?> loadClass(String name, boolean resolve) throws ClassNotFoundException {
+            if (!name.startsWith(prefix)) {
+                return super.loadClass(name, resolve);
+            }
+            synchronized (getClassLoadingLock(name)) {
+                Class<?> c = findLoadedClass(name);
+                if (c == null) {
+                    c = findClass(name);
+                }
+                if (resolve) {
+                    resolveClass(c);
+                }
+                return c;
+            }
+        }
+    }
+
+    public static void main(String[] args) throws IOException {
+        URL jar = new File(args[0]).toURI().toURL();
+        String mainClass = args.length > 1 ? args[1] : "venus.Driver";
+        String prefix = mainClass.substring(0, mainClass.indexOf('.') + 1);
+        URLClassLoader shared = new URLClassLoader(new URL[] {jar}, ClassLoader.getPlatformClassLoader());
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        OutputStream out = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+
+        // Venus ends programs with System.exit; turn that into an exception we can catch.
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitException(status);
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            out.write(("unavailable this JVM does not allow a SecurityManager (" + e.getMessage() + ")\n").getBytes(StandardCharsets.UTF_8));
+            out.flush();
+            System.exit(1);
+        }
+        out.write("ready\n".getBytes(StandardCharsets.UTF_8));
+        out.flush();
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            int argc = Integer.parseInt(line.trim());
+            String[] venusArgs = new String[argc];
+            for (int i = 0; i < argc; i++) {
+                venusArgs[i] = in.readLine();
+            }
+            ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+            ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+            int status = run(jar, prefix, shared, mainClass, venusArgs, stdout, stderr);
+            byte[] o = stdout.toByteArray();
+            byte[] e = stderr.toByteArray();
+            out.write((status + " " + o.length + " " + e.length + "\n").getBytes(StandardCharsets.UTF_8));
+            out.write(o);
+            out.write(e);
+            out.flush();
+        }
+    }
+
+    private static int run(URL jar, String prefix, ClassLoader shared, String mainClass, String[] args,
+                           OutputStream stdout, OutputStream stderr) {
+        InputStream oldIn = System.in;
+        PrintStream oldOut = System.out;
+        PrintStream oldErr = System.err;
+        PrintStream newOut = new PrintStream(stdout, true);
+        PrintStream newErr = new PrintStream(stderr, true);
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        System.setOut(newOut);
+        System.setErr(newErr);
+        Thread thread = Thread.currentThread();
+        ClassLoader oldContext = thread.getContextClassLoader();
+        try (URLClassLoader loader = new ReloadingClassLoader(jar, prefix, shared)) {
+            thread.setContextClassLoader(loader);
+            Method main = loader.loadClass(mainClass).getMethod("main", String[].class);
+            main.invoke(null, (Object) args);
+            return 0;
+        } catch (InvocationTargetException e) {
+            for (Throwable t = e.getCause(); t != null; t = t.getCause()) {
+                if (t instanceof ExitException) {
+                    return ((ExitException) t).status;
+                }
+            }
+            // Mimic the JVM's behaviour for an uncaught exception.
+            e.getCause().printStackTrace(newErr);
+            return 1;
+        } catch (ExitException e) {
+            return e.status;
+        } catch (Exception e) {
+            e.printStackTrace(newErr);
+            return 1;
+        } finally {
+            thread.setContextClassLoader(oldContext);
+            newOut.flush();
+            newErr.flush();
+            System.setIn(oldIn);
+            System.setOut(oldOut);
+            System.setErr(oldErr);
+        }
+    }
+}
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Lazy, read-only access to binary matrix files.
+
+A binary matrix file holds two little-endian int32s, the number of rows and
+columns, followed by rows * columns little-endian int32 elements in row-major
+order. BinMatrix maps the file into memory instead of reading it, so only the
+parts that are actually looked at are paged in.
+
+    with BinMatrix("m0.bin") as m:
+        print(m.shape, m[0, 3], list(m.row(1)))
+"""
+
+import sys
+import mmap
+import struct
+from array import array
+
+HEADER_SIZE = 8
+ELEMENT_SIZE = 4
+
+class BinMatrix:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self.file.close()
+            raise ValueError("{} is too small to be a matrix file".format(path))
+        if len(self.buf) < HEADER_SIZE:
+            self.close()
+            raise ValueError("{} is too small to be a matrix file".format(path))
+        self.rows, self.cols = struct.unpack_from("<ii", self.buf, 0)
+        if self.rows < 0 or self.cols < 0 or len(self.buf) < self.nbytes:
+            self.close()
+            raise ValueError("{} is not a valid {}x{} matrix file".format(path, self.rows, self.cols))
+
+    @property
+    def shape(self):
+        return self.rows, self.cols
+
+    @property
+    def nbytes(self):
+        return HEADER_SIZE + ELEMENT_SIZE * self.rows * self.cols
+
+    def offset(self, row, col):
+        """Returns the byte offset of element (row, col) in the file."""
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise IndexError("({}, {}) is out of bounds for a {}x{} matrix".format(row, col, self.rows, self.cols))
+        return HEADER_SIZE + ELEMENT_SIZE * (row * self.cols + col)
+
+    def __getitem__(self, index):
+        row, col = index
+        return struct.unpack_from("<i", self.buf, self.offset(row, col))[0]
+
+    def row(self, row):
+        """Returns a sequence of the ints in one row.
+
+        This is a view of the mapped file, so it must be released (or dropped)
+        before the matrix is closed. On big-endian hosts a swapped copy is
+        returned instead.
+        """
+        if not 0 <= row < self.rows:
+            raise IndexError("row {} is out of bounds for a {}x{} matrix".format(row, self.rows, self.cols))
+        start = HEADER_SIZE + ELEMENT_SIZE * row * self.cols
+        return self._ints(start, start + ELEMENT_SIZE * self.cols)
+
+    def data(self):
+        """Returns a sequence of every element in row-major order, see row()."""
+        return self._ints(HEADER_SIZE, self.nbytes)
+
+    def _ints(self, start, end):
+        view = memoryview(self.buf)[start:end]
+        if sys.byteorder == "little":
+            return view.cast("i")
+        values = array("i")
+        values.frombytes(view)
+        values.byteswap()
+        view.release()
+        return values
+
+    def close(self):
+        self.buf.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
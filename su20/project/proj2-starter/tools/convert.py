@@ -3,67 +3,130 @@
 import sys
 import argparse
 import os
+import glob
+import struct
+from array import array
+from binmatrix import BinMatrix, HEADER_SIZE, ELEMENT_SIZE
+from concurrent.futures import ProcessPoolExecutor
+
+def to_little_endian(arr):
+    # array('i') uses the machine's byte order, the matrix format is always little-endian
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
 
 def ascii_to_binary(args):
     # Open input and output files
     input = open(args.input_file, 'r')
     output = open(args.output_file, 'wb')
 
-    # Read in lines of input
-    input_rows = input.readlines()
-
-    # Read in strings representing integer dimensions, save as bytes to output
-    dims = [int(s) for s in input_rows[0].split()]
-    for d in dims:
-        output.write(d.to_bytes(4, "little", signed=True))
-
-    # Read in each row of the matrix
-    for row in input_rows[1:]:
-        # Read in float elements of each row, output as bytes to output
-        int_row = [int(s) for s in row.split()]
-        for num in int_row:
-            output.write(num.to_bytes(4, "little", signed=True))
+    # The dimensions and elements are all whitespace separated integers, so
+    # parse the whole file in one pass and write it out as a single block
+    values = array("i", map(int, input.read().split()))
+    output.write(to_little_endian(values).tobytes())
 
     input.close()
     output.close()
 
 def binary_to_ascii(args):
-    # Open input and output files
-    input = open(args.input_file, 'rb')
+    # Map the input file and open the output file
+    input = BinMatrix(args.input_file)
     output = open(args.output_file, 'w')
 
-    # Read in bytes representing integer dimensions, save as strngs to output
-    rows = int.from_bytes(input.read(4), "little", signed=True)
-    columns = int.from_bytes(input.read(4), "little", signed=True)
+    # Save the integer dimensions as strings to output
+    rows, columns = input.shape
     output.write("{} {}{}".format(rows, columns, os.linesep))
 
-    # Read in one row's worth of elements at a time
+    # Write out one row per line, straight from the mapped file
     for i in range(rows):
-        curr_row = []
-        # For each row, read in bytes representing floats, then save the row as a string to output
-        for j in range(columns):
-            val = int.from_bytes(input.read(4), "little", signed=True)
-            curr_row.append(str(val))
-        output.write(" ".join(curr_row) + os.linesep)
+        output.write(" ".join(map(str, input.row(i))) + os.linesep)
 
     input.close()
     output.close()
 
+def convert_file(convert, input_file, output_file):
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    convert(argparse.Namespace(input_file=input_file, output_file=output_file))
+
+def output_relpath(relpath, src_ext, dst_ext):
+    # The inputs keep each format in its own directory (e.g. inputs/simple0/txt/m0.txt and
+    # inputs/simple0/bin/m0.bin), so directories named after the source format are renamed too
+    dirs, filename = os.path.split(relpath)
+    dirs = [dst_ext[1:] if part == src_ext[1:] else part for part in dirs.split(os.sep) if part]
+    return os.path.join(*dirs, os.path.splitext(filename)[0] + dst_ext)
+
+def is_matrix_file(path, ext):
+    # Other files share the extensions, like the mnist labels, which are a single integer in a .txt
+    # file, so check for a "rows cols" first line, or a header matching the size of a .bin file
+    if ext == ".txt":
+        with open(path, "r") as f:
+            dims = f.readline().split()
+        return len(dims) == 2 and all(d.isdigit() for d in dims)
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        return False
+    rows, cols = struct.unpack("<ii", header)
+    return rows >= 0 and cols >= 0 and os.path.getsize(path) == HEADER_SIZE + ELEMENT_SIZE * rows * cols
+
+def convert_tree(args, convert, src_ext, dst_ext):
+    # Pair every matching file under input_file with the same relative path under output_file,
+    # with txt directories swapped for bin ones or the other way around
+    pattern = args.glob or "**/*" + src_ext
+    jobs = []
+    skipped = 0
+    ignored = 0
+    for input_file in sorted(glob.glob(os.path.join(args.input_file, pattern), recursive=True)):
+        if not os.path.isfile(input_file):
+            continue
+        if not is_matrix_file(input_file, src_ext):
+            ignored += 1
+            continue
+        relpath = os.path.relpath(input_file, args.input_file)
+        output_file = os.path.join(args.output_file, output_relpath(relpath, src_ext, dst_ext))
+        # Skip outputs that are newer than their inputs
+        if not args.force and os.path.isfile(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(input_file):
+            skipped += 1
+            continue
+        jobs.append((input_file, output_file))
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(convert_file, convert, input_file, output_file) for input_file, output_file in jobs]
+        for (input_file, output_file), future in zip(jobs, futures):
+            try:
+                future.result()
+            except Exception as e:
+                print("Could not convert {}: {}".format(input_file, e))
+                failed += 1
+
+    print("Converted {}, skipped {} up to date, ignored {} that are not matrices, failed {}".format(len(jobs) - failed, skipped, ignored, failed))
+    return failed == 0
+
 def main():
     parser = argparse.ArgumentParser(description="Converts between ascii and binary files representing integer matrices")
-    parser.add_argument("input_file", help="file to read from")
-    parser.add_argument("output_file", help="file to write to")
+    parser.add_argument("input_file", help="file to read from, or a directory to convert every matching file in")
+    parser.add_argument("output_file", help="file to write to, or the directory to mirror converted files into, with txt directories swapped for bin ones (or the other way around)")
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--to-binary", action="store_true", default=False, help="convert from ascii to binary")
     group.add_argument("--to-ascii", action="store_true", default=False, help="convert from binary to ascii")
+    parser.add_argument("--glob", help="files to convert when input_file is a directory, relative to it (default: **/*.txt or **/*.bin)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes when input_file is a directory (default: one per CPU)")
+    parser.add_argument("-f", "--force", action="store_true", default=False, help="convert files even if the output is newer than the input")
 
     args = parser.parse_args()
     if args.to_binary:
-        ascii_to_binary(args)
+        convert, src_ext, dst_ext = ascii_to_binary, ".txt", ".bin"
     elif args.to_ascii:
-        binary_to_ascii(args)
+        convert, src_ext, dst_ext = binary_to_ascii, ".bin", ".txt"
     else:
         parser.error("Either --to-binary or --to-ascii must be specified")
 
+    if os.path.isdir(args.input_file):
+        if not convert_tree(args, convert, src_ext, dst_ext):
+            sys.exit(1)
+    else:
+        convert(args)
+
 if __name__ == "__main__":
     main()
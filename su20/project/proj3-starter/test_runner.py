@@ -8,21 +8,43 @@ import subprocess
 import signal
 import re
 import sys
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 script_dir = os.path.realpath(sys.path[0])
 logisim_location = os.path.join(script_dir, "logisim-evolution.jar")
+tools_location = os.path.join(script_dir, "../../tools")
+state_location = os.path.join(script_dir, ".test_runner_state.json")
+trace_cache_location = os.path.join(script_dir, ".reference_trace_cache.json")
+
+sys.path.insert(0, tools_location)
+from logisim_server import LogisimServerPool
 
 class LogisimTest():
   """
   Runs a circuit file and compares output against the provided reference file.
   """
 
-  def __init__(self, group_path, circ_path, trace_path):
+  def __init__(self, group_path, circ_path, trace_path, fail_fast=False, context=0, servers=None, traces=None):
     self.group_path  = group_path
     self.circ_path  = circ_path
     self.trace_path = trace_path
+    self.fail_fast = fail_fast
+    self.context = context
+    self.servers = servers
+    self.traces = traces
+
+  def reference(self):
+    if self.traces is not None:
+      return self.traces.load(self.trace_path)
+    return ReferenceTrace(self.trace_path)
 
   def __call__(self, filename):
+    server = self.servers.get(self.group_path) if self.servers is not None else None
+    if server is not None:
+      return self.run_on_server(server, filename)
     output = tempfile.TemporaryFile(mode="r+")
     try:
       stdinf = open("/dev/null")
@@ -34,8 +56,8 @@ class LogisimTest():
     proc = subprocess.Popen(["java", "-jar", logisim_location, "-tty", "table", self.circ_path],
                             cwd=self.group_path, stdin=stdinf, stdout=subprocess.PIPE)
     try:
-      reference = open(self.trace_path)
-      passed = compare_unbounded(proc.stdout, reference, filename)
+      reference = self.reference()
+      passed = compare_unbounded(proc.stdout, reference, filename, self.fail_fast, self.context)
     finally:
       try:
         os.kill(proc.pid, signal.SIGTERM)
@@ -46,33 +68,200 @@ class LogisimTest():
     else:
       return (False, "Did not match expected output")
 
-def compare_unbounded(student_out, reference_out, filename):
+  def run_on_server(self, server, filename):
+    try:
+      output = server.run(self.circ_path)
+      try:
+        reference = self.reference()
+        passed = compare_unbounded(output, reference, filename, self.fail_fast, self.context)
+      finally:
+        output.close()
+    finally:
+      self.servers.put(server)
+    if passed:
+      return (True, "Matched expected output")
+    else:
+      return (False, "Did not match expected output")
+
+REGEX_CHARS = set(".^$*+?{}[]\\|()")
+
+class ReferenceTrace():
+  """
+  A parsed reference output. Lines without regex metacharacters are compared
+  as plain strings, and only the remaining lines are compiled as patterns.
+  `regex_lines`, the indices of the pattern lines, skips finding them again.
+  """
+
+  def __init__(self, path, regex_lines=None):
+    self.lines = []
+    with open(path) as reference:
+      for line in reference:
+        line = line.rstrip()
+        # The comparison has always stopped at the first blank reference line
+        if line == "":
+          break
+        self.lines.append(line)
+    if regex_lines is None:
+      regex_lines = [index for index, line in enumerate(self.lines) if not REGEX_CHARS.isdisjoint(line)]
+    self.regex_lines = regex_lines
+    self.lines = [(line, None) for line in self.lines]
+    for index in regex_lines:
+      line = self.lines[index][0]
+      self.lines[index] = (line, re.compile(line))
+
+  def __len__(self):
+    return len(self.lines)
+
+  def matches(self, index, student_line):
+    line, pattern = self.lines[index]
+    if pattern is None:
+      # Same as a regex match of a literal pattern
+      return student_line.startswith(line)
+    m = pattern.match(student_line)
+    return m is not None and m.end() == len(line)
+
+class ReferenceTraceCache():
+  """
+  Remembers which lines of each reference output are patterns, keyed by the
+  file's path, size and modification time, so that later runs only look for
+  them again in references that changed.
+  """
+
+  def __init__(self, path=trace_cache_location):
+    self.path = path
+    self.entries = {}
+    self.changed = False
+    self.lock = threading.Lock()
+    if os.path.isfile(path):
+      try:
+        with open(path) as f:
+          self.entries = json.load(f)
+      except ValueError:
+        print("Ignoring unreadable reference trace cache in %s" % path)
+
+  def load(self, trace_path):
+    name = os.path.relpath(trace_path, script_dir)
+    stat = os.stat(trace_path)
+    version = [stat.st_size, stat.st_mtime_ns]
+    with self.lock:
+      entry = self.entries.get(name)
+    if entry is not None and entry["version"] == version:
+      try:
+        return ReferenceTrace(trace_path, entry["regex_lines"])
+      except IndexError:
+        # The file changed without its size or modification time changing
+        pass
+    trace = ReferenceTrace(trace_path)
+    with self.lock:
+      self.entries[name] = {"version": version, "regex_lines": trace.regex_lines}
+      self.changed = True
+    return trace
+
+  def save(self):
+    if self.changed:
+      with open(self.path, "w") as f:
+        json.dump(self.entries, f, indent=1, sort_keys=True)
+
+def compare_unbounded(student_out, reference, filename, fail_fast=False, context=0):
+  """
+  Compares the student output against the reference line by line, writing the
+  student output to filename as it goes. With fail_fast, stops reading
+  `context` lines after the first mismatch.
+  """
   passed = True
-  student_output_array = []
-  while True:
-    line1 = student_out.readline().rstrip().decode("utf-8", "namereplace")
-    line2 = reference_out.readline().rstrip()
-    if line2 == "":
-      break
-    student_output_array.append(line1)
-    m = re.match(line2, line1)
-    if m == None or m.start() != 0 or m.end() != len(line2):
-      passed = False
+  remaining = None
   with open(filename, "w") as student_output:
-    for line in student_output_array:
-      student_output.write(line + "\n")
+    for index in range(len(reference)):
+      if remaining == 0:
+        break
+      line1 = student_out.readline().rstrip().decode("utf-8", "namereplace")
+      student_output.write(line1 + "\n")
+      if remaining is not None:
+        remaining -= 1
+      if not reference.matches(index, line1):
+        passed = False
+        if fail_fast and remaining is None:
+          remaining = context
   return passed
 
-def run_test(group_path, test_slug, output_type=None):
+def test_paths(group_path, test_slug, output_type=None):
   output_slug = test_slug
   if output_type:
     output_slug += "-" + output_type
   circ_path = os.path.join(group_path, "%s.circ" % test_slug)
   reference_output_path = os.path.join(group_path, "reference_output/%s-ref.out" % output_slug)
   student_output_path = os.path.join(group_path, "student_output/%s-student.out" % output_slug)
-  test_runner = LogisimTest(group_path, circ_path, reference_output_path)
+  return circ_path, reference_output_path, student_output_path
+
+def run_test(group_path, test_slug, output_type=None, fail_fast=False, context=0, servers=None, traces=None):
+  circ_path, reference_output_path, student_output_path = test_paths(group_path, test_slug, output_type)
+  test_runner = LogisimTest(group_path, circ_path, reference_output_path, fail_fast, context, servers, traces)
   return test_runner(student_output_path)
 
+LIB_PATTERN = re.compile(r'<lib desc="file#([^"]+)"')
+
+class TestState():
+  """
+  Remembers a hash of the circuits and reference output each test last passed
+  with, so that tests nothing has changed for can be skipped.
+  """
+
+  def __init__(self, path=state_location):
+    self.path = path
+    self.passed = {}
+    self.digests = {}
+    if os.path.isfile(path):
+      try:
+        with open(path) as f:
+          self.passed = json.load(f)
+      except ValueError:
+        print("Ignoring unreadable test state in %s" % path)
+
+  def digest(self, path):
+    if path not in self.digests:
+      try:
+        with open(path, "rb") as f:
+          self.digests[path] = hashlib.sha256(f.read()).hexdigest()
+      except OSError:
+        self.digests[path] = "missing"
+    return self.digests[path]
+
+  def dependencies(self, circ_path):
+    """
+    Returns circ_path and every circuit it loads as a library, transitively.
+    """
+    seen = []
+    todo = [os.path.normpath(circ_path)]
+    while todo:
+      path = todo.pop()
+      if path in seen:
+        continue
+      seen.append(path)
+      if os.path.isfile(path):
+        with open(path, encoding="utf-8", errors="replace") as f:
+          for lib in LIB_PATTERN.findall(f.read()):
+            todo.append(os.path.normpath(os.path.join(os.path.dirname(path), lib)))
+    return seen
+
+  def key(self, circ_path, reference_output_path):
+    h = hashlib.sha256()
+    for path in sorted(self.dependencies(circ_path)) + [reference_output_path]:
+      h.update(("%s:%s\n" % (os.path.relpath(path, script_dir), self.digest(path))).encode("utf-8"))
+    return h.hexdigest()
+
+  def unchanged(self, name, key):
+    return self.passed.get(name) == key
+
+  def record(self, name, key, passed):
+    if passed:
+      self.passed[name] = key
+    else:
+      self.passed.pop(name, None)
+
+  def save(self):
+    with open(self.path, "w") as f:
+      json.dump(self.passed, f, indent=1, sort_keys=True)
+
 class TestPart:
   def __init__(self, part, group, tests):
     self.part = part
@@ -82,7 +271,7 @@ class TestPart:
   def get(self):
     return (self.part, self.group, self.tests)
 
-def run_tests(mpart, mgroup, test):
+def run_tests(mpart, mgroup, test, jobs=1, fail_fast=False, context=0, batch=False, changed_only=False):
   test_parts = []
   parts = sorted([folder for folder in os.listdir(os.path.join(script_dir, "tests")) if os.path.isdir(os.path.join(script_dir, "tests", folder))]) if mpart is None else [mpart]
   for part in parts:
@@ -111,31 +300,67 @@ def run_tests(mpart, mgroup, test):
           tests.append(("%s test" % test_slug, test_slug))
 
       test_parts.append(TestPart(part, group, tests))
-  for part, group, tests in [p.get() for p in test_parts]:
-    part_path = os.path.join(script_dir, "tests", part)
-    group_path = "%s/%s" % (part_path, group)
-    print("Running tests for %s/%s..." % (part, group))
-    tests_passed = 0
-    tests_failed = 0
-
-    for test in tests:
-      description, test_slug = test[:2]
-      output_type = (test[2] if len(test) >= 3 else None)
-      did_pass, fail_reason = False, "Unknown test error"
-      try:
-        did_pass, fail_reason = run_test(group_path, test_slug, output_type)
-      except Exception as ex:
-        print(ex)
-      if did_pass:
-        print("\tPASSED test: %s" % description)
-        tests_passed += 1
+  servers = LogisimServerPool(logisim_location, max(jobs, 1)) if batch else None
+  state = TestState()
+  traces = ReferenceTraceCache()
+  try:
+    report_tests(test_parts, jobs, fail_fast, context, servers, state, traces, changed_only)
+  finally:
+    state.save()
+    traces.save()
+    if servers is not None:
+      servers.close()
+
+def report_tests(test_parts, jobs, fail_fast, context, servers, state, traces, changed_only):
+  with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+    # Start every test up front, then report them group by group in the usual order
+    results = []
+    for part, group, tests in [p.get() for p in test_parts]:
+      part_path = os.path.join(script_dir, "tests", part)
+      group_path = "%s/%s" % (part_path, group)
+      futures = []
+      for test in tests:
+        test_slug = test[1]
+        output_type = (test[2] if len(test) >= 3 else None)
+        circ_path, reference_output_path, _ = test_paths(group_path, test_slug, output_type)
+        name = os.path.relpath(reference_output_path, script_dir)
+        key = state.key(circ_path, reference_output_path)
+        if changed_only and state.unchanged(name, key):
+          futures.append((name, key, None))
+        else:
+          futures.append((name, key, pool.submit(run_test, group_path, test_slug, output_type, fail_fast, context, servers, traces)))
+      results.append((part, group, tests, futures))
+
+    for part, group, tests, futures in results:
+      print("Running tests for %s/%s..." % (part, group))
+      tests_passed = 0
+      tests_failed = 0
+      tests_skipped = 0
+
+      for test, (name, key, future) in zip(tests, futures):
+        description = test[0]
+        if future is None:
+          print("\tSKIPPED test: %s (unchanged since it last passed)" % description)
+          tests_skipped += 1
+          continue
+        did_pass, fail_reason = False, "Unknown test error"
+        try:
+          did_pass, fail_reason = future.result()
+        except Exception as ex:
+          print(ex)
+        state.record(name, key, did_pass)
+        if did_pass:
+          print("\tPASSED test: %s" % description)
+          tests_passed += 1
+        else:
+          print("\tFAILED test: %s (%s)" % (description, fail_reason))
+          tests_failed += 1
+      if len(tests) == 0:
+        print("There are no tests for %s/%s!\n" % (part, group))
+      elif tests_skipped > 0:
+        print("Passed %d/%d tests, skipped %d unchanged tests\n" % (tests_passed, (tests_passed + tests_failed), tests_skipped))
       else:
-        print("\tFAILED test: %s (%s)" % (description, fail_reason))
-        tests_failed += 1
-    if len(tests) == 0:
-      print("There are no tests for %s/%s!\n" % (part, group))
-    else:
-      print("Passed %d/%d tests\n" % (tests_passed, (tests_passed + tests_failed)))
+        print("Passed %d/%d tests\n" % (tests_passed, (tests_passed + tests_failed)))
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description="Run Logisim tests")
@@ -143,6 +368,11 @@ if __name__ == "__main__":
   parser.add_argument("part", choices=parts, help="The project part the test is under (a/b)", nargs="?", default=None)
   parser.add_argument("group", help="The group of tests to run. If left blank, it will run all the tests of the part", default=None, nargs="?")
   parser.add_argument("test", help="A specific test file to run. You must specify the correct group and the full filename! If left blank, it will be ignored", nargs="?")
+  parser.add_argument("-j", "--jobs", type=int, default=1, help="The number of tests to run at the same time")
+  parser.add_argument("--fail-fast", action="store_true", help="Stop a test at its first mismatching line")
+  parser.add_argument("--context", type=int, default=0, help="With --fail-fast, how many more lines to record after the first mismatch")
+  parser.add_argument("--batch", action="store_true", help="Run the circuits one after another in a resident Logisim JVM per job, instead of starting Logisim for every test")
+  parser.add_argument("--changed", action="store_true", help="Only run tests whose circuits (including the circuits they load) or reference output changed since they last passed")
   args = parser.parse_args()
   
-  run_tests(args.part, args.group, args.test)
+  run_tests(args.part, args.group, args.test, args.jobs, args.fail_fast, args.context, args.batch, args.changed)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+from __future__ import print_function
+
+import sys
+
+# Logisim prints every value as space separated groups of up to 4 bits. Each
+# group becomes one hex digit, or 'x' if it holds anything but 0s and 1s.
+NIBBLES = dict((format(v, '0%db' % width), '%x' % v) for width in range(1, 5) for v in range(1 << width))
+
+def nibble(group):
+	try:
+		return NIBBLES[group]
+	except KeyError:
+		try:
+			return hex(int(group, 2))[2:]
+		except Exception:
+			return 'x'
+
+# Most fields (e.g. a register that didn't change) repeat from one cycle to the
+# next, so remember what each tab separated field decoded to
+field_cache = {}
+FIELD_CACHE_SIZE = 1 << 16
+
+def decode_groups(line):
+	hexes = []
+	for field in line.split('\t'):
+		digits = field_cache.get(field)
+		if digits is None:
+			digits = [nibble(group) for group in field.split()]
+			if len(field_cache) >= FIELD_CACHE_SIZE:
+				field_cache.clear()
+			field_cache[field] = digits
+		hexes.extend(digits)
+	return hexes
+
+class Layout(object):
+	"""
+	Describes how to turn one line of a trace into hex: the header to print
+	first, and the columns to print, each with a name, an optional label and
+	the range of bit groups it is made of. `step` names the column that
+	identifies a line (the cycle or test number).
+	"""
+
+	def __init__(self, header, separator, step, columns):
+		self.header = header
+		self.separator = separator
+		self.step = step
+		self.columns = columns
+		self.names = [name for name, label, start, end in columns]
+
+	def fields(self, line):
+		"""
+		Returns the value of every column of a line, in hex, by name.
+		"""
+		hexes = decode_groups(line)
+		return dict((name, ''.join(hexes[start:end])) for name, label, start, end in self.columns)
+
+	def decode_line(self, line):
+		hexes = decode_groups(line)
+		parts = []
+		for name, label, start, end in self.columns:
+			if label is not None:
+				parts.append(label)
+			parts.append(''.join(hexes[start:end]))
+		return self.separator.join(parts)
+
+	def decode(self, lines, out):
+		if self.header is not None:
+			out.write(self.header + '\n')
+		for line in lines:
+			out.write(self.decode_line(line) + '\n')
+
+CPU = Layout(None, ' ', 'Time_Step', [
+	('ra', 'ra: ', 0, 8),
+	('sp', 'sp: ', 8, 16),
+	('t0', 't0: ', 16, 24),
+	('t1', 't1: ', 24, 32),
+	('t2', 't2: ', 32, 40),
+	('s0', 's0: ', 40, 48),
+	('s1', 's1: ', 48, 56),
+	('a0', 'a0: ', 56, 64),
+	('PC', 'PC: ', 64, 72),
+	('inst', 'inst: ', 72, 80),
+	('Time_Step', 'Time_Step: ', 80, 84),
+])
+
+ALU = Layout('Op#\tALUSel\tInputA\t\tInputB\t\tALU_Output', '\t', 'Op#', [
+	('Op#', None, 0, 2),
+	('ALUSel', None, 10, 11),
+	('InputA', None, 11, 19),
+	('InputB', None, 19, 27),
+	('ALU_Output', None, 2, 10),
+])
+
+REGFILE = Layout('Op#\trd\trs1\trs2\tRegWEn\tWriteData\tra (x1)\t\tsp (x2)\t\tt0 (x5)\t\tt1 (x6)\t\tt2 (x7)\t\ts0 (x8)\t\ts1 (x9)\t\ta0 (x10)\tReadData1\tReadData2', '\t', 'Op#', [
+	('Op#', None, 0, 2),
+	('rd', None, 86, 88),
+	('rs1', None, 82, 84),
+	('rs2', None, 84, 86),
+	('RegWEn', None, 88, 89),
+	('WriteData', None, 89, 97),
+	('ra', None, 2, 10),
+	('sp', None, 10, 18),
+	('t0', None, 18, 26),
+	('t1', None, 26, 34),
+	('t2', None, 34, 42),
+	('s0', None, 42, 50),
+	('s1', None, 50, 58),
+	('a0', None, 58, 66),
+	('ReadData1', None, 66, 74),
+	('ReadData2', None, 74, 82),
+])
+
+LAYOUTS = {'cpu': CPU, 'alu': ALU, 'regfile': REGFILE}
+
+def decode_file(path, layout, out=sys.stdout):
+	with open(path) as trace:
+		layout.decode(trace, out)
+
+def main(args):
+	if len(args) != 3 or args[1] not in LAYOUTS:
+		print('Usage: %s {%s} <trace file>' % (args[0], ','.join(sorted(LAYOUTS))), file=sys.stderr)
+		sys.exit(1)
+	decode_file(args[2], LAYOUTS[args[1]])
+
+if __name__ == '__main__':
+	main(sys.argv)
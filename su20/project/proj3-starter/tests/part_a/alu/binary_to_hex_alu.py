@@ -2,30 +2,14 @@
 
 from __future__ import print_function
 
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../..'))
+import binary_to_hex
+
 def main(args):
-	file = open(args[1])
-	lines = [l for l in file.readlines()]
-	def mapper(string):
-		try:
-			return hex(int(string, 2))[2:]
-		except Exception:
-			return 'x'
-	results = []
-	for l in lines:
-		hexes = list(map(mapper, l.split()))
-		op = ''.join(hexes[:2])
-		aluOutput = ''.join(hexes[2:10])
-		aluSel = ''.join(hexes[10:11])
-		inputA = ''.join(hexes[11:19])
-		inputB = ''.join(hexes[19:27])
-		result = [op, aluSel, inputA, inputB, aluOutput]
-		results.append(result)
-	print('Op#\tALUSel\tInputA\t\tInputB\t\tALU_Output')
-	for r in results:
-		string = '\t'.join(r)
-		print(string)
+	binary_to_hex.decode_file(args[1], binary_to_hex.ALU)
 
 if __name__ == '__main__':
 	main(sys.argv)
@@ -2,40 +2,156 @@
 
 import xml.etree.ElementTree as ET
 import argparse
+import hashlib
+import io
+import json
 import os
 import re
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import random_program
 
 ASM_FILE_EXTENSION = ".s"
 VENUS_TRACE_PATTERN = "%1%\t%2%\t%5%\t%6%\t%7%\t%8%\t%9%\t%10%\t%pc%\t%inst%\t%line%\n"
+# Seconds Venus gets to run a program before it is assumed to never terminate
+VENUS_TIMEOUT = 60
 
 script_dir = os.path.realpath(sys.path[0])
 logisim_path = os.path.join(script_dir, "../../../logisim-evolution.jar")
 venus_path = os.path.join(script_dir, "../../../venus-cs61c-su20-proj3.jar")
+cache_path = os.path.join(script_dir, ".create-test-cache.json")
+run_circ_path = os.path.join(script_dir, "../../../run.circ")
+
+class CircuitTemplate():
+  """
+  run.circ, parsed once, with its ROM contents and cycle count Constant left
+  as holes. Test circuits are stamped out by filling in just those holes.
+  """
+
+  ROM_HOLE = "@@ROM_CONTENTS@@"
+  CYCLES_HOLE = "@@NUM_CYCLES@@"
+
+  def __init__(self, circ_path=run_circ_path):
+    tree = ET.parse(circ_path)
+    root = tree.getroot()
+    circuit = root.find("circuit")
+
+    ROM = circuit.find("./comp/[@name='ROM']")
+    ROM[2].text = self.ROM_HOLE
+
+    constant = circuit.find("./comp/[@name='Constant']")
+    constant[1].attrib["val"] = self.CYCLES_HOLE
+
+    cpu_lib = root.find("./lib/[@desc='file#cpu.circ']")
+    cpu_lib.attrib["desc"] = "file#../../../cpu.circ"
+
+    self.pieces = re.split("(%s|%s)" % (self.ROM_HOLE, self.CYCLES_HOLE), ET.tostring(root, encoding="unicode"))
+    if len(self.pieces) != 5:
+      raise ValueError("%s should have exactly one ROM and one Constant" % circ_path)
+
+  def render(self, instruction_strs, num_cycles):
+    # Chop off 0x prefixes
+    rom_instructions = " ".join(s[2:] if s.startswith("0x") else s for s in instruction_strs)
+    values = {
+      self.ROM_HOLE: "addr/data: 14 32\n" + rom_instructions + "\n",
+      self.CYCLES_HOLE: hex(num_cycles),
+    }
+    return "".join(values.get(piece, piece) for piece in self.pieces)
+
+  def write(self, test_circ_path, instruction_strs, num_cycles):
+    with open(test_circ_path, "w", encoding="us-ascii", errors="xmlcharrefreplace", newline="") as test_circ_file:
+      test_circ_file.write(self.render(instruction_strs, num_cycles))
+
+circuit_template = None
+
+def get_circuit_template():
+  global circuit_template
+  if circuit_template is None:
+    circuit_template = CircuitTemplate()
+  return circuit_template
 
-def main(asm_file_paths, num_cycles):
-  error_log_path = os.path.join(script_dir, "error.log")
+def run_venus(venus_cmd):
+  """
+  Raises subprocess.TimeoutExpired if Venus takes longer than VENUS_TIMEOUT.
+  """
+  proc = subprocess.run(venus_cmd, cwd=script_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True, timeout=VENUS_TIMEOUT)
+  return proc.returncode, proc.stdout, proc.stderr
 
-  for asm_file_path in asm_file_paths:
-    asm_filename = os.path.basename(asm_file_path)
-    # Check file extension
-    if not asm_filename.endswith(ASM_FILE_EXTENSION):
-      print("Invalid assembly file: %s (file extension mismatch)" % asm_filename)
-      continue
+def print_venus_error(log, what, test_slug, stdout, stderr):
+  log("Venus errored when generating %s for %s!" % (what, test_slug))
+  log("-----From stdout-----")
+  log(stdout)
+  log("-----From stderr-----")
+  log(stderr)
 
-    # Generate filepaths
-    input_slug = asm_filename[:-len(ASM_FILE_EXTENSION)]
-    test_slug = "cpu-%s" % input_slug
+def cache_key(asm_file_path, num_cycles):
+  """
+  Hashes everything the Venus output depends on: the assembly, the cycle
+  count and the Venus build.
+  """
+  h = hashlib.sha256()
+  with open(asm_file_path, "rb") as asm_file:
+    h.update(asm_file.read())
+  try:
+    venus_stat = os.stat(venus_path)
+    venus_version = "%d %d" % (venus_stat.st_size, venus_stat.st_mtime_ns)
+  except OSError:
+    venus_version = "missing"
+  h.update(("\n%d %s" % (num_cycles, venus_version)).encode("utf-8"))
+  return h.hexdigest()
 
-    asm_file_path = os.path.join(os.getcwd(), asm_file_path)
-    hex_data_path = os.path.join(script_dir, "inputs/%s.hex" % input_slug)
-    reference_output_path = os.path.join(script_dir, "reference_output/%s-ref.out" % test_slug)
-    run_circ_path = os.path.join(script_dir, "../../../run.circ")
-    test_circ_path = os.path.join(script_dir, "%s.circ" % test_slug)
+def test_slug(asm_file_path):
+  """
+  Returns the name of the test created for an assembly file, which all of its
+  outputs are named after, or None if it is not an assembly file.
+  """
+  asm_filename = os.path.basename(asm_file_path)
+  if not asm_filename.endswith(ASM_FILE_EXTENSION):
+    return None
+  return "cpu-%s" % asm_filename[:-len(ASM_FILE_EXTENSION)]
 
-    print("Generating test for %s..." % test_slug)
+def create_test(asm_file_path, num_cycles, cached=None):
+  """
+  Creates the test for one assembly file. Returns everything it would have
+  printed, and the cache entry for the test (None if it failed).
+  """
+  output = io.StringIO()
+  log = lambda *args: print(*args, file=output)
 
+  asm_filename = os.path.basename(asm_file_path)
+  # Check file extension
+  if not asm_filename.endswith(ASM_FILE_EXTENSION):
+    log("Invalid assembly file: %s (file extension mismatch)" % asm_filename)
+    return output.getvalue(), None
+
+  # Generate filepaths
+  input_slug = asm_filename[:-len(ASM_FILE_EXTENSION)]
+  test_slug = "cpu-%s" % input_slug
+
+  asm_file_path = os.path.join(os.getcwd(), asm_file_path)
+  hex_data_path = os.path.join(script_dir, "inputs/%s.hex" % input_slug)
+  reference_output_path = os.path.join(script_dir, "reference_output/%s-ref.out" % test_slug)
+  test_circ_path = os.path.join(script_dir, "%s.circ" % test_slug)
+
+  log("Generating test for %s..." % test_slug)
+
+  try:
+    key = cache_key(asm_file_path, num_cycles)
+  except Exception as e:
+    log(e)
+    log("Error reading assembly file, skipping %s" % test_slug)
+    return output.getvalue(), None
+
+  if cached is not None and cached["key"] == key and os.path.isfile(reference_output_path) and os.path.isfile(hex_data_path):
+    # Nothing Venus depends on has changed, so reuse its previous output
+    test_num_cycles = cached["cycles"]
+    with open(hex_data_path, "r") as hex_data_file:
+      instruction_strs = hex_data_file.read().strip().split("\n")
+    log("  Reused reference output and machine code (cycles: %d)" % test_num_cycles)
+  else:
     # Generate reference output
     test_num_cycles = num_cycles
     venus_cmd = ["java", "-jar", venus_path, asm_file_path, "-it", "-t", "-ti", "-tp", VENUS_TRACE_PATTERN, "-ts", "-ur"]
@@ -43,99 +159,114 @@ def main(asm_file_paths, num_cycles):
       venus_cmd.append("-tn")
       venus_cmd.append(str(num_cycles + 1))
     try:
-      with open(reference_output_path, "w") as stdout, open(error_log_path, "w") as stderr:
-        proc = subprocess.Popen(venus_cmd, cwd=script_dir, stdout=stdout, stderr=stderr)
-        proc.wait()
-      with open(reference_output_path, "r+") as reference_output_file:
-        reference_output = reference_output_file.read()
-        if proc.returncode != 0 or "[ERROR]" in reference_output:
-          print("Venus errored when generating reference output for %s!" % test_slug)
-          print("-----From stdout-----")
-          print(reference_output)
-          print("-----From stderr-----")
-          try:
-            with open(error_log_path, "r") as error_log_file:
-              print(error_log_file.read())
-          except Exception as e:
-            print(e)
-          continue
-
-        # Cleanup reference output
-        reference_output = re.sub("\n\n+", "\n", reference_output)
-        if test_num_cycles == -1:
-          test_num_cycles = reference_output.strip().count("\n") + 1
-        reference_output_file.seek(0)
+      returncode, reference_output, stderr = run_venus(venus_cmd)
+      if returncode != 0 or "[ERROR]" in reference_output:
+        print_venus_error(log, "reference output", test_slug, reference_output, stderr)
+        return output.getvalue(), None
+
+      # Cleanup reference output
+      reference_output = re.sub("\n\n+", "\n", reference_output)
+      if test_num_cycles == -1:
+        test_num_cycles = reference_output.strip().count("\n") + 1
+      with open(reference_output_path, "w") as reference_output_file:
         reference_output_file.write(reference_output)
-        reference_output_file.truncate()
+    except subprocess.TimeoutExpired:
+      log("Venus did not finish running %s within %d seconds, so it probably never terminates; give -n to limit the cycles" % (asm_filename, VENUS_TIMEOUT))
+      log("Skipping %s" % test_slug)
+      return output.getvalue(), None
     except Exception as e:
-      print(e)
-      print("Error generating reference output, skipping %s" % test_slug)
-      continue
-    print("  Generated reference output (cycles: %d)" % test_num_cycles)
+      log(e)
+      log("Error generating reference output, skipping %s" % test_slug)
+      return output.getvalue(), None
+    log("  Generated reference output (cycles: %d)" % test_num_cycles)
 
     # Generate machine code
     instruction_strs = None
     venus_cmd = ["java", "-jar", venus_path, "-d", asm_file_path]
     try:
-      with open(hex_data_path, "w") as stdout, open(error_log_path, "w") as stderr:
-        proc = subprocess.Popen(venus_cmd, cwd=script_dir, stdout=stdout, stderr=stderr)
-        proc.wait()
-      with open(hex_data_path, "r") as hex_data_file:
-        hex_data = hex_data_file.read()
-        if proc.returncode != 0 or "[ERROR]" in hex_data:
-          print("Venus errored when generating machine code for %s!" % test_slug)
-          print("-----From stdout-----")
-          print(hex_data)
-          print("-----From stderr-----")
-          try:
-            with open(error_log_path, "r") as error_log_file:
-              print(error_log_file.read())
-          except Exception as e:
-            print(e)
-          continue
-
-        instruction_strs = hex_data.strip().split("\n")
-    except Exception as e:
-      print(e)
-      print("Error generating machine code, skipping %s" % test_slug)
-      continue
-    print("  Generated machine code")
-
-    # Generate test circuit
-    try:
-      rom_instructions = ""
-      for instruction_str in instruction_strs:
-        # Chop off 0x prefix
-        if instruction_str.startswith("0x"):
-          instruction_str = instruction_str[2:]
-        rom_instructions += instruction_str + " "
-      rom_instructions = rom_instructions[:-1] + "\n"
+      returncode, hex_data, stderr = run_venus(venus_cmd)
+      with open(hex_data_path, "w") as hex_data_file:
+        hex_data_file.write(hex_data)
+      if returncode != 0 or "[ERROR]" in hex_data:
+        print_venus_error(log, "machine code", test_slug, hex_data, stderr)
+        return output.getvalue(), None
 
-      tree = ET.parse(run_circ_path)
-      root = tree.getroot()
-      circuit = root.find("circuit")
+      instruction_strs = hex_data.strip().split("\n")
+    except Exception as e:
+      log(e)
+      log("Error generating machine code, skipping %s" % test_slug)
+      return output.getvalue(), None
+    log("  Generated machine code")
 
-      ROM = circuit.find("./comp/[@name='ROM']")
-      ROM[2].text = "addr/data: 14 32\n" + rom_instructions
+  # Generate test circuit
+  try:
+    get_circuit_template().write(test_circ_path, instruction_strs, test_num_cycles)
+  except Exception as e:
+    log(e)
+    log("Error generating test circuit, skipping %s" % test_slug)
+    return output.getvalue(), None
 
-      constant = circuit.find("./comp/[@name='Constant']")
-      constant[1].attrib["val"] = hex(test_num_cycles)
+  log("  Created test %s!" % test_slug)
+  return output.getvalue(), {"key": key, "cycles": test_num_cycles}
 
-      cpu_lib = root.find("./lib/[@desc='file#cpu.circ']")
-      cpu_lib.attrib["desc"] = "file#../../../cpu.circ"
+def load_cache():
+  try:
+    with open(cache_path, "r") as cache_file:
+      return json.load(cache_file)
+  except (OSError, ValueError):
+    return {}
 
-      tree.write(test_circ_path)
-    except Exception as e:
-      print(e)
-      print("Error generating test circuit, skipping %s" % test_slug)
-      continue
+def main(asm_file_paths, num_cycles, jobs=1, use_cache=True):
+  # Entries are keyed by test, as that is what the outputs they vouch for are named after
+  cache_names = [test_slug(asm_file_path) or os.path.realpath(asm_file_path) for asm_file_path in asm_file_paths]
+  # Two jobs writing the same outputs would race, so every test may only be created once
+  sources = {}
+  for asm_file_path, name in zip(asm_file_paths, cache_names):
+    if name in sources:
+      raise ValueError("%s and %s would both create %s" % (sources[name], asm_file_path, name))
+    sources[name] = asm_file_path
+  cache = load_cache()
+  # This run's new entries, or None for tests that failed
+  updates = {}
 
-    print("  Created test %s!" % test_slug)
+  try:
+    with ProcessPoolExecutor(max_workers=max(jobs, 1)) as pool:
+      futures = [pool.submit(create_test, asm_file_path, num_cycles, cache.get(name) if use_cache else None)
+                 for asm_file_path, name in zip(asm_file_paths, cache_names)]
+      # Print each test's output in the order the files were given
+      for name, future in zip(cache_names, futures):
+        output, entry = future.result()
+        updates[name] = entry
+        print(output, end="")
+  finally:
+    # Merge into the cache as it is now, so that entries of tests this run did not touch are kept
+    cache = load_cache()
+    for name, entry in updates.items():
+      if entry is None:
+        cache.pop(name, None)
+      else:
+        cache[name] = entry
+    with open(cache_path, "w") as cache_file:
+      json.dump(cache, cache_file, indent=1, sort_keys=True)
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description="Create custom CPU tests")
-  parser.add_argument("tests", nargs="+", help="Paths to RISC-V assembly files (ending in \".s\") you want to create tests for")
+  parser.add_argument("tests", nargs="*", help="Paths to RISC-V assembly files (ending in \".s\") you want to create tests for")
   parser.add_argument("-n", type=int, default=-1, help="How many cycles you want to simulate the CPU for (default is the number of cycles Venus takes to run your code)")
+  parser.add_argument("-j", "--jobs", type=int, default=1, help="How many tests to create at the same time")
+  parser.add_argument("--no-cache", action="store_true", help="Rerun Venus even for assembly files that have not changed since their test was last created")
+  parser.add_argument("--random", type=int, default=0, metavar="COUNT", help="Also create tests for this many random programs, written to inputs/random-<seed>-<n>.s")
+  parser.add_argument("--seed", type=int, default=0, help="Seed for the random programs")
+  parser.add_argument("--length", type=int, default=32, help="Roughly how many instructions each random program has")
   args = parser.parse_args()
 
-  main(args.tests, args.n)
+  tests = args.tests
+  if args.random > 0:
+    tests += random_program.write_programs(os.path.join(script_dir, "inputs"), args.random, args.seed, args.length)
+  if not tests:
+    parser.error("Give at least one assembly file, or --random")
+
+  try:
+    main(tests, args.n, args.jobs, not args.no_cache)
+  except ValueError as e:
+    parser.error(str(e))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+
+# The registers shown in the reference trace (see VENUS_TRACE_PATTERN in create-test.py)
+REGISTERS = ["ra", "sp", "t0", "t1", "t2", "s0", "s1", "a0"]
+SOURCES = REGISTERS + ["x0"]
+
+BRANCHES = ["beq", "bne", "blt", "bge", "bltu", "bgeu"]
+
+# How often each kind of instruction is picked, mirroring the cpu-*.circ test groups
+WEIGHTS = {
+  "add": 4,
+  "sll": 2,
+  "addi": 6,
+  "lui": 2,
+  "branch": 3,
+  "jal": 1,
+  "jalr": 1,
+  "sw": 2,
+  "lw": 2,
+}
+
+# Programs are at most this many instructions long, and all loads and stores go
+# to addresses above them so that they never touch the program itself
+MAX_LENGTH = 256
+DATA_START = 4 * MAX_LENGTH
+DATA_END = 2048
+
+def pick_target(rng, low, end, jalrs):
+  """
+  Picks a branch or jump target in [low, end]. A jalr is never picked, as
+  jumping to it would skip the addi that sets up its base register.
+  """
+  return rng.choice([target for target in range(low, end + 1) if target not in jalrs])
+
+def generate_program(rng, length):
+  """
+  Returns the text of a random program of about `length` instructions. Every
+  branch and jump goes forwards, so the program always terminates.
+  """
+  length = max(1, min(length, MAX_LENGTH - 2))
+  kinds = []
+  while len(kinds) < length:
+    kind = rng.choices(list(WEIGHTS), weights=list(WEIGHTS.values()))[0]
+    if kind == "jalr":
+      # Load the target address into a register, then jump to it
+      kinds += ["jalr-target", "jalr"]
+    else:
+      kinds.append(kind)
+  # The last slot is the end label every branch and jump may target
+  end = len(kinds)
+  jalrs = {i for i, kind in enumerate(kinds) if kind == "jalr"}
+
+  targets = {}
+  lines = []
+  for i, kind in enumerate(kinds):
+    if kind == "add":
+      lines.append("add %s %s %s" % (rng.choice(REGISTERS), rng.choice(SOURCES), rng.choice(SOURCES)))
+    elif kind == "sll":
+      lines.append("sll %s %s %s" % (rng.choice(REGISTERS), rng.choice(SOURCES), rng.choice(SOURCES)))
+    elif kind == "addi":
+      lines.append("addi %s %s %d" % (rng.choice(REGISTERS), rng.choice(SOURCES), rng.randint(-2048, 2047)))
+    elif kind == "lui":
+      lines.append("lui %s %d" % (rng.choice(REGISTERS), rng.randint(0, 0xfffff)))
+    elif kind == "branch":
+      target = pick_target(rng, i + 1, end, jalrs)
+      targets[target] = True
+      lines.append("%s %s %s L%d" % (rng.choice(BRANCHES), rng.choice(SOURCES), rng.choice(SOURCES), target))
+    elif kind == "jal":
+      target = pick_target(rng, i + 1, end, jalrs)
+      targets[target] = True
+      lines.append("jal %s L%d" % (rng.choice(REGISTERS + ["x0"]), target))
+    elif kind == "jalr-target":
+      # Jump past the jalr itself
+      target = pick_target(rng, i + 2, end, jalrs)
+      base = rng.choice(REGISTERS)
+      lines.append("addi %s x0 %d" % (base, 4 * target))
+    elif kind == "jalr":
+      lines.append("jalr %s %s 0" % (rng.choice(REGISTERS + ["x0"]), base))
+    elif kind == "sw":
+      lines.append("sw %s %d(x0)" % (rng.choice(SOURCES), rng.randrange(DATA_START, DATA_END, 4)))
+    elif kind == "lw":
+      lines.append("lw %s %d(x0)" % (rng.choice(REGISTERS), rng.randrange(DATA_START, DATA_END, 4)))
+  lines.append("add a0 a0 x0")
+
+  return "".join(("L%d: " % i if i in targets else "") + line + "\n" for i, line in enumerate(lines))
+
+def write_programs(directory, count, seed, length):
+  """
+  Writes `count` random programs to directory, returning their paths. The
+  same seed always gives the same programs.
+  """
+  rng = random.Random(seed)
+  paths = []
+  for i in range(count):
+    path = os.path.join(directory, "random-%d-%d.s" % (seed, i))
+    with open(path, "w") as asm_file:
+      asm_file.write(generate_program(rng, length))
+    paths.append(path)
+  return paths
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Generate random RISC-V programs for the CPU")
+  parser.add_argument("count", type=int, help="How many programs to generate")
+  parser.add_argument("-o", "--output", default=".", help="Directory to write the programs to")
+  parser.add_argument("--seed", type=int, default=0, help="Seed for the random number generator")
+  parser.add_argument("--length", type=int, default=32, help="Roughly how many instructions each program has")
+  args = parser.parse_args()
+
+  for path in write_programs(args.output, args.count, args.seed, args.length):
+    print(path)
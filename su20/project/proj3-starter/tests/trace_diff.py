@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+import binary_to_hex
+
+# Bit ranges (low, high) of the fields of an RV32I instruction
+INSTRUCTION_FIELDS = [
+	('opcode', 0, 6),
+	('rd', 7, 11),
+	('funct3', 12, 14),
+	('rs1', 15, 19),
+	('rs2', 20, 24),
+	('funct7', 25, 31),
+]
+
+def instruction_fields(expected, actual):
+	"""
+	Returns the names of the instruction fields that differ between two
+	instructions given in hex, or None if either one has unknown bits.
+	"""
+	try:
+		expected = int(expected, 16)
+		actual = int(actual, 16)
+	except ValueError:
+		return None
+	differing = []
+	for name, low, high in INSTRUCTION_FIELDS:
+		mask = ((1 << (high - low + 1)) - 1) << low
+		if expected & mask != actual & mask:
+			differing.append(name)
+	return differing
+
+def first_divergence(student, reference, layout):
+	"""
+	Walks the student and reference traces together, one cycle (or test) at a
+	time, and returns a description of the first place they differ, or None if
+	they match. The student trace may run longer than the reference.
+	"""
+	line_number = 0
+	for reference_line in reference:
+		if reference_line.strip() == '':
+			break
+		line_number += 1
+		student_line = student.readline()
+		expected = layout.fields(reference_line)
+		step = expected[layout.step]
+		if student_line.strip() == '':
+			return {'line': line_number, 'step': step, 'reason': 'student trace ended early', 'fields': []}
+		actual = layout.fields(student_line)
+		if actual[layout.step] != step:
+			return {
+				'line': line_number,
+				'step': step,
+				'reason': 'student trace is at %s %s' % (layout.step, actual[layout.step]),
+				'fields': [],
+			}
+		fields = []
+		for name in layout.names:
+			if actual[name] != expected[name]:
+				field = {'name': name, 'expected': expected[name], 'actual': actual[name]}
+				if name == 'inst':
+					field['inst_fields'] = instruction_fields(expected[name], actual[name])
+				fields.append(field)
+		if fields:
+			return {'line': line_number, 'step': step, 'reason': 'values differ', 'fields': fields}
+	return None
+
+def print_divergence(divergence, layout):
+	if divergence is None:
+		print('The traces match')
+		return
+	print('First divergence at %s %s (line %d): %s' % (layout.step, divergence['step'], divergence['line'], divergence['reason']))
+	for field in divergence['fields']:
+		message = '\t%s: expected %s, got %s' % (field['name'], field['expected'], field['actual'])
+		if field.get('inst_fields'):
+			message += ' (%s differ)' % ', '.join(field['inst_fields'])
+		print(message)
+
+def main(args):
+	parser = argparse.ArgumentParser(description='Find the first cycle where a student trace differs from the reference')
+	parser.add_argument('student', help='The student output, e.g. student_output/cpu-addi-student.out')
+	parser.add_argument('reference', help='The reference output, e.g. reference_output/cpu-addi-ref.out')
+	parser.add_argument('--layout', choices=sorted(binary_to_hex.LAYOUTS), default='cpu', help='What kind of trace this is (default: cpu)')
+	parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+	args = parser.parse_args(args)
+
+	layout = binary_to_hex.LAYOUTS[args.layout]
+	with open(args.student) as student, open(args.reference) as reference:
+		divergence = first_divergence(student, reference, layout)
+	if args.json:
+		print(json.dumps({'match': divergence is None, 'divergence': divergence}, indent=1))
+	else:
+		print_divergence(divergence, layout)
+	return 0 if divergence is None else 1
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,7 @@
 #include "CUnit/CUnit.h"
 #include "CUnit/Basic.h"
 #include "matrix.h"
+#include <stdint.h>
 #include <stdio.h>
 
 /* Test Suite setup and cleanup functions: */
@@ -150,6 +151,36 @@ void pow_test(void) {
   deallocate_matrix(mat);
 }
 
+void fused_test(void) {
+  matrix *result = NULL;
+  matrix *mat1 = NULL;
+  matrix *mat2 = NULL;
+  CU_ASSERT_EQUAL(allocate_matrix(&result, 2, 2), 0);
+  CU_ASSERT_EQUAL(allocate_matrix(&mat1, 2, 2), 0);
+  CU_ASSERT_EQUAL(allocate_matrix(&mat2, 2, 2), 0);
+  for (int i = 0; i < 4; i++) {
+    mat1->data[i] = i;
+    mat2->data[i] = i * 3;
+  }
+  // abs(-mat1 + mat2 - mat2 - mat2)
+  fused_node nodes[] = {
+    {FUSED_LEAF, -1, -1, mat1->data},
+    {FUSED_NEG, 0, -1, NULL},
+    {FUSED_LEAF, -1, -1, mat2->data},
+    {FUSED_ADD, 1, 2, NULL},
+    {FUSED_SUB, 3, 2, NULL},
+    {FUSED_SUB, 4, 2, NULL},
+    {FUSED_ABS, 5, -1, NULL},
+  };
+  CU_ASSERT_EQUAL(eval_fused(result, nodes, 7), 0);
+  for (int i = 0; i < 4; i++) {
+    CU_ASSERT_EQUAL(result->data[i], 4 * i);
+  }
+  deallocate_matrix(result);
+  deallocate_matrix(mat1);
+  deallocate_matrix(mat2);
+}
+
 void alloc_fail_test(void) {
   matrix *mat = NULL;
   CU_ASSERT_EQUAL(allocate_matrix(&mat, 0, 0), -1);
@@ -205,6 +236,27 @@ void dealloc_null_test(void) {
   deallocate_matrix(mat); // Test the null case doesn't crash
 }
 
+void pool_reuse_test(void) {
+  matrix *mat = NULL;
+  matrix_pool_stats before, after;
+  CU_ASSERT_EQUAL(allocate_matrix_uninitialized(&mat, 4, 4), 0);
+  double *data = mat->data;
+  CU_ASSERT_EQUAL((uintptr_t)data % 64, 0);
+  free_matrix_data(mat);
+  free_matrix_struct(mat);
+  get_matrix_pool_stats(&before);
+  CU_ASSERT_EQUAL(allocate_matrix_uninitialized(&mat, 4, 4), 0);
+  get_matrix_pool_stats(&after);
+  CU_ASSERT_PTR_EQUAL(mat->data, data);
+  CU_ASSERT_EQUAL(after.hits, before.hits + 1);
+  free_matrix_data(mat);
+  free_matrix_struct(mat);
+  CU_ASSERT_NOT_EQUAL(trim_matrix_pool(0), 0);
+  get_matrix_pool_stats(&after);
+  CU_ASSERT_EQUAL(after.cached_bytes, 0);
+  CU_ASSERT_EQUAL(after.cached_buffers, 0);
+}
+
 void get_test(void) {
   matrix *mat = NULL;
   allocate_matrix(&mat, 2, 2);
@@ -260,11 +312,13 @@ int main (void)
         (CU_add_test(pSuite, "neg_test", neg_test) == NULL) ||
         (CU_add_test(pSuite, "abs_test", abs_test) == NULL) ||
         (CU_add_test(pSuite, "pow_test", pow_test) == NULL) ||
+        (CU_add_test(pSuite, "fused_test", fused_test) == NULL) ||
         (CU_add_test(pSuite, "alloc_fail_test", alloc_fail_test) == NULL) ||
         (CU_add_test(pSuite, "alloc_success_test", alloc_success_test) == NULL) ||
         (CU_add_test(pSuite, "alloc_ref_fail_test", alloc_ref_fail_test) == NULL) ||
         (CU_add_test(pSuite, "alloc_ref_success_test", alloc_ref_success_test) == NULL) ||
         (CU_add_test(pSuite, "dealloc_null_test", dealloc_null_test) == NULL) ||
+        (CU_add_test(pSuite, "pool_reuse_test", pool_reuse_test) == NULL) ||
         (CU_add_test(pSuite, "get_test", get_test) == NULL) ||
         (CU_add_test(pSuite, "set_test", set_test) == NULL)
      )
@@ -1,7 +1,9 @@
 #include "matrix.h"
+#include <math.h>
 #include <stddef.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <omp.h>
 
 // Include SSE intrinsics
@@ -43,22 +45,242 @@ void rand_matrix(matrix *result, unsigned int seed, double low, double high) {
     }
 }
 
+/*
+ * MATRIX POOL
+ * Operations allocate and free same-sized results and temporaries constantly, so freed data
+ * buffers are kept on one free list per size class and handed out again, and freed matrix structs
+ * are kept too. Size classes are powers of two bytes up to 2^POOL_FINE_SHIFT bytes, and above that
+ * split every doubling into four steps, so a buffer is never more than a quarter larger than asked. Buffers are POOL_ALIGNMENT-byte aligned so that AVX code
+ * can use aligned loads and stores on whole matrices. The cache is bounded by POOL_MAX_PER_CLASS
+ * buffers per class and POOL_MAX_CACHED_BYTES overall; anything past that goes back to the system.
+ */
+#define POOL_ALIGNMENT 64
+#define POOL_MIN_SHIFT 6 // the smallest size class is 64 bytes
+#define POOL_FINE_SHIFT 8 // classes from 2^8 bytes on are a quarter of a doubling apart
+#define POOL_MAX_SHIFT 31 // the largest size class is 2^31 bytes; larger buffers are never cached
+#define POOL_COARSE_CLASSES (POOL_FINE_SHIFT - POOL_MIN_SHIFT + 1)
+#define POOL_NUM_CLASSES (POOL_COARSE_CLASSES + 4 * (POOL_MAX_SHIFT - POOL_FINE_SHIFT))
+#define POOL_MAX_PER_CLASS 8
+#define POOL_MAX_CACHED_BYTES ((size_t)512 << 20)
+#define POOL_MAX_STRUCTS 256
+
+static void *pool_buffers[POOL_NUM_CLASSES]; // free buffers, linked through their first bytes
+static int pool_buffer_counts[POOL_NUM_CLASSES];
+static matrix *pool_structs; // free structs, linked through parent
+static int pool_struct_count;
+static matrix_pool_stats pool_stats;
+
+/* Returns the size of the buffers in size class `cls` */
+static size_t class_bytes(int cls) {
+    if (cls < POOL_COARSE_CLASSES) {
+        return (size_t)1 << (cls + POOL_MIN_SHIFT);
+    }
+    int shift = POOL_FINE_SHIFT + (cls - POOL_COARSE_CLASSES) / 4;
+    int steps = (cls - POOL_COARSE_CLASSES) % 4 + 1;
+    return ((size_t)1 << shift) + ((size_t)steps << (shift - 2));
+}
+
+/* Returns the size class of a buffer of `bytes` bytes, or POOL_NUM_CLASSES if it is too large */
+static int size_class(size_t bytes) {
+    if (bytes <= ((size_t)1 << POOL_FINE_SHIFT)) {
+        int cls = 0;
+        while (((size_t)1 << (cls + POOL_MIN_SHIFT)) < bytes) {
+            cls++;
+        }
+        return cls;
+    }
+    if (bytes > ((size_t)1 << POOL_MAX_SHIFT)) {
+        return POOL_NUM_CLASSES;
+    }
+    /* bytes is in (2^shift, 2^(shift + 1)], which is split into four steps of 2^(shift - 2) */
+    int shift = POOL_FINE_SHIFT;
+    while (((size_t)2 << shift) < bytes) {
+        shift++;
+    }
+    size_t step = (size_t)1 << (shift - 2);
+    int steps = (int)((bytes - ((size_t)1 << shift) + step - 1) / step);
+    return POOL_COARSE_CLASSES + 4 * (shift - POOL_FINE_SHIFT) + steps - 1;
+}
+
+/* Returns how many bytes are actually allocated for a buffer of `bytes` bytes */
+static size_t allocated_bytes(size_t bytes) {
+    int cls = size_class(bytes);
+    if (cls < POOL_NUM_CLASSES) {
+        return class_bytes(cls);
+    }
+    return (bytes + POOL_ALIGNMENT - 1) / POOL_ALIGNMENT * POOL_ALIGNMENT;
+}
+
+/* Returns an aligned buffer of at least `bytes` bytes, or NULL if allocating it fails */
+static double *pool_alloc_data(size_t bytes) {
+    int cls = size_class(bytes);
+    size_t size = allocated_bytes(bytes);
+    void *buf = NULL;
+    #pragma omp critical (matrix_pool)
+    {
+        if (cls < POOL_NUM_CLASSES && pool_buffers[cls] != NULL) {
+            buf = pool_buffers[cls];
+            pool_buffers[cls] = *(void **)buf;
+            pool_buffer_counts[cls]--;
+            pool_stats.cached_buffers--;
+            pool_stats.cached_bytes -= size;
+            pool_stats.hits++;
+        } else {
+            pool_stats.misses++;
+        }
+    }
+    if (buf == NULL && posix_memalign(&buf, POOL_ALIGNMENT, size) != 0) {
+        return NULL;
+    }
+    #pragma omp critical (matrix_pool)
+    {
+        pool_stats.live_buffers++;
+        pool_stats.live_bytes += size;
+    }
+    return buf;
+}
+
+/* Returns a buffer from pool_alloc_data of `bytes` bytes to the pool */
+static void pool_free_data(void *buf, size_t bytes) {
+    int cls = size_class(bytes);
+    size_t size = allocated_bytes(bytes);
+    int cached = 0;
+    #pragma omp critical (matrix_pool)
+    {
+        pool_stats.live_buffers--;
+        pool_stats.live_bytes -= size;
+        if (cls < POOL_NUM_CLASSES && pool_buffer_counts[cls] < POOL_MAX_PER_CLASS &&
+            pool_stats.cached_bytes + size <= POOL_MAX_CACHED_BYTES) {
+            *(void **)buf = pool_buffers[cls];
+            pool_buffers[cls] = buf;
+            pool_buffer_counts[cls]++;
+            pool_stats.cached_buffers++;
+            pool_stats.cached_bytes += size;
+            cached = 1;
+        }
+    }
+    if (!cached) {
+        free(buf);
+    }
+}
+
+/* Returns an uninitialized matrix struct, or NULL if allocating it fails */
+static matrix *pool_alloc_struct(void) {
+    matrix *mat = NULL;
+    #pragma omp critical (matrix_pool)
+    {
+        if (pool_structs != NULL) {
+            mat = pool_structs;
+            pool_structs = mat->parent;
+            pool_struct_count--;
+        }
+    }
+    return mat != NULL ? mat : malloc(sizeof(matrix));
+}
+
+static void pool_free_struct(matrix *mat) {
+    int cached = 0;
+    #pragma omp critical (matrix_pool)
+    {
+        if (pool_struct_count < POOL_MAX_STRUCTS) {
+            mat->parent = pool_structs;
+            pool_structs = mat;
+            pool_struct_count++;
+            cached = 1;
+        }
+    }
+    if (!cached) {
+        free(mat);
+    }
+}
+
+/* Copies the pool's current statistics to `stats` */
+void get_matrix_pool_stats(matrix_pool_stats *stats) {
+    #pragma omp critical (matrix_pool)
+    {
+        *stats = pool_stats;
+    }
+}
+
+/*
+ * Frees cached buffers, largest first, until at most `keep_bytes` bytes are cached, and frees all
+ * cached structs. Returns how many bytes of buffers were freed.
+ */
+size_t trim_matrix_pool(size_t keep_bytes) {
+    size_t freed = 0;
+    #pragma omp critical (matrix_pool)
+    {
+        for (int cls = POOL_NUM_CLASSES - 1; cls >= 0; cls--) {
+            size_t size = class_bytes(cls);
+            while (pool_buffers[cls] != NULL && pool_stats.cached_bytes > keep_bytes) {
+                void *buf = pool_buffers[cls];
+                pool_buffers[cls] = *(void **)buf;
+                pool_buffer_counts[cls]--;
+                pool_stats.cached_buffers--;
+                pool_stats.cached_bytes -= size;
+                free(buf);
+                freed += size;
+            }
+        }
+        while (pool_structs != NULL) {
+            matrix *mat = pool_structs;
+            pool_structs = mat->parent;
+            free(mat);
+        }
+        pool_struct_count = 0;
+    }
+    return freed;
+}
+
 /*
  * Allocates space for a matrix struct pointed to by the double pointer mat with
  * `rows` rows and `cols` columns. You should also allocate memory for the data array
  * and initialize all entries to be zeros. `parent` should be set to NULL to indicate that
- * this matrix is not a slice. You should also set `ref_cnt` to 1.
+ * this matrix is not a slice. You should also set `ref_cnt` to 1, `base` to NULL
+ * and `exports` to 0.
  * You should return -1 if either `rows` or `cols` or both have invalid values, or if any
  * call to allocate memory in this function fails. Return 0 upon success.
+ * allocate_matrix_uninitialized below does all of this except zeroing the entries. Get the struct
+ * and the data from it rather than allocating them yourself, as free_matrix_data hands the data
+ * back to the matrix pool, which assumes it came from there.
  */
 int allocate_matrix(matrix **mat, int rows, int cols) {
     /* TODO: YOUR CODE HERE */
 }
 
+/*
+ * Same as allocate_matrix, but leaves the entries uninitialized, for results that are about to be
+ * overwritten entirely. The struct and the data come from the matrix pool, so free them with
+ * free_matrix_struct and free_matrix_data.
+ */
+int allocate_matrix_uninitialized(matrix **mat, int rows, int cols) {
+    if (rows <= 0 || cols <= 0) {
+        return -1;
+    }
+    matrix *new_mat = pool_alloc_struct();
+    if (new_mat == NULL) {
+        return -1;
+    }
+    new_mat->data = pool_alloc_data((size_t)rows * cols * sizeof(double));
+    if (new_mat->data == NULL) {
+        pool_free_struct(new_mat);
+        return -1;
+    }
+    new_mat->rows = rows;
+    new_mat->cols = cols;
+    new_mat->ref_cnt = 1;
+    new_mat->parent = NULL;
+    new_mat->base = NULL;
+    new_mat->exports = 0;
+    *mat = new_mat;
+    return 0;
+}
+
 /*
  * Allocates space for a matrix struct pointed to by `mat` with `rows` rows and `cols` columns.
  * Its data should point to the `offset`th entry of `from`'s data (you do not need to allocate memory)
  * for the data field. `parent` should be set to `from` to indicate this matrix is a slice of `from`.
+ * `base` should be set to NULL and `exports` to 0.
  * You should return -1 if either `rows` or `cols` or both are non-positive or if any
  * call to allocate memory in this function fails. Return 0 upon success.
  */
@@ -66,10 +288,61 @@ int allocate_matrix_ref(matrix **mat, matrix *from, int offset, int rows, int co
     /* TODO: YOUR CODE HERE */
 }
 
+/*
+ * Allocates space for a matrix struct pointed to by `mat` with `rows` rows and `cols` columns
+ * whose data is the buffer `view` of rows * cols contiguous doubles exported by another object.
+ * No memory is allocated for the data, and the matrix takes over `view`: it is released (instead
+ * of the data being freed) once the matrix and all its slices are deallocated. The caller still
+ * owns `view` if this fails. Return -1 if either `rows` or `cols` or both are non-positive, if
+ * `view` is too small, or if allocating the struct fails. Return 0 upon success.
+ */
+int allocate_matrix_buffer(matrix **mat, Py_buffer *view, int rows, int cols) {
+    if (rows <= 0 || cols <= 0 || view->len < (Py_ssize_t)rows * cols * (Py_ssize_t)sizeof(double)) {
+        return -1;
+    }
+    matrix *new_mat = pool_alloc_struct();
+    if (new_mat == NULL) {
+        return -1;
+    }
+    new_mat->rows = rows;
+    new_mat->cols = cols;
+    new_mat->data = view->buf;
+    new_mat->ref_cnt = 1;
+    new_mat->parent = NULL;
+    new_mat->base = view;
+    new_mat->exports = 0;
+    *mat = new_mat;
+    return 0;
+}
+
+/*
+ * Returns the data of a matrix that is not a slice to the matrix pool, or releases the buffer it
+ * belongs to instead if it came from allocate_matrix_buffer.
+ */
+void free_matrix_data(matrix *mat) {
+    if (mat->base != NULL) {
+        PyBuffer_Release(mat->base);
+        PyMem_Free(mat->base);
+        mat->base = NULL;
+    } else {
+        pool_free_data(mat->data, (size_t)mat->rows * mat->cols * sizeof(double));
+    }
+    mat->data = NULL;
+}
+
+/*
+ * Frees a matrix struct from any of the allocate_matrix functions, once its data has been dealt with.
+ */
+void free_matrix_struct(matrix *mat) {
+    pool_free_struct(mat);
+}
+
 /*
  * You need to make sure that you only free `mat->data` if `mat` is not a slice and has no existing slices,
  * or if `mat` is the last existing slice of its parent matrix and its parent matrix has no other references
- * (including itself). You cannot assume that mat is not NULL.
+ * (including itself). You cannot assume that mat is not NULL. Use free_matrix_data to free the
+ * data, as it may belong to a buffer rather than have been allocated by allocate_matrix, and
+ * free_matrix_struct to free the struct. Slices count their own slices in `ref_cnt` too, so a slice of a slice keeps both alive.
  */
 void deallocate_matrix(matrix *mat) {
     /* TODO: YOUR CODE HERE */
@@ -148,3 +421,69 @@ int abs_matrix(matrix *result, matrix *mat) {
     /* TODO: YOUR CODE HERE */
 }
 
+
+/*
+ * Evaluates the element-wise expression described by `nodes` (see fused_node in matrix.h) into
+ * `result`, whose shape every leaf shares, in a single pass over memory: the entries are split
+ * into blocks of FUSED_BLOCK, and every node is computed for one block at a time into a small
+ * per-thread buffer that stays in cache, so only the leaves are read from memory and only the
+ * result is written to it. Blocks are spread over OpenMP threads. `result` may not share data
+ * with any leaf. Return 0 upon success and a nonzero value upon failure.
+ */
+#define FUSED_BLOCK 256
+
+int eval_fused(matrix *result, fused_node *nodes, int num_nodes) {
+    if (num_nodes <= 0 || num_nodes > FUSED_MAX_NODES || nodes[num_nodes - 1].op == FUSED_LEAF) {
+        return -1;
+    }
+    long size = (long)result->rows * result->cols;
+    long num_blocks = (size + FUSED_BLOCK - 1) / FUSED_BLOCK;
+    #pragma omp parallel
+    {
+        double scratch[FUSED_MAX_NODES][FUSED_BLOCK] __attribute__((aligned(POOL_ALIGNMENT)));
+        double *values[FUSED_MAX_NODES];
+        #pragma omp for schedule(static)
+        for (long block = 0; block < num_blocks; block++) {
+            long start = block * FUSED_BLOCK;
+            int len = size - start < FUSED_BLOCK ? size - start : FUSED_BLOCK;
+            for (int k = 0; k < num_nodes; k++) {
+                fused_node *node = &nodes[k];
+                if (node->op == FUSED_LEAF) {
+                    values[k] = node->data + start;
+                    continue;
+                }
+                double *out = k == num_nodes - 1 ? result->data + start : scratch[k];
+                double *x = values[node->left];
+                double *y = node->op == FUSED_ADD || node->op == FUSED_SUB ? values[node->right] : NULL;
+                switch (node->op) {
+                case FUSED_ADD:
+                    #pragma omp simd
+                    for (int i = 0; i < len; i++) {
+                        out[i] = x[i] + y[i];
+                    }
+                    break;
+                case FUSED_SUB:
+                    #pragma omp simd
+                    for (int i = 0; i < len; i++) {
+                        out[i] = x[i] - y[i];
+                    }
+                    break;
+                case FUSED_NEG:
+                    #pragma omp simd
+                    for (int i = 0; i < len; i++) {
+                        out[i] = -x[i];
+                    }
+                    break;
+                case FUSED_ABS:
+                    #pragma omp simd
+                    for (int i = 0; i < len; i++) {
+                        out[i] = fabs(x[i]);
+                    }
+                    break;
+                }
+                values[k] = out;
+            }
+        }
+    }
+    return 0;
+}
@@ -6,13 +6,44 @@ typedef struct matrix {
     double* data; // pointer to rows * columns doubles
     int ref_cnt; // How many slices/matrices are referring to this matrix's data
     struct matrix *parent; // NULL if matrix is not a slice, else the parent matrix of the slice
+    Py_buffer *base; // NULL unless data belongs to another object's buffer (see allocate_matrix_buffer)
+    int exports; // How many views of this matrix's data numc has handed out to Python (see numc.c)
 } matrix;
 
+/* Statistics of the pool that allocate_matrix takes matrices from (see matrix.c) */
+typedef struct matrix_pool_stats {
+    size_t hits; // allocations served by a cached buffer
+    size_t misses; // allocations that needed a new buffer
+    size_t live_buffers; // buffers in use by matrices
+    size_t live_bytes;
+    size_t cached_buffers; // freed buffers kept for reuse
+    size_t cached_bytes;
+} matrix_pool_stats;
+
+/*
+ * One node of a fused element-wise expression (see eval_fused). Nodes are listed so that every
+ * node comes after its operands, which are given by their indices; the last node is the result.
+ */
+#define FUSED_MAX_NODES 32
+enum { FUSED_LEAF, FUSED_ADD, FUSED_SUB, FUSED_NEG, FUSED_ABS };
+typedef struct fused_node {
+    int op; // one of the FUSED_* operations above
+    int left; // index of the first operand, unless op is FUSED_LEAF
+    int right; // index of the second operand, for FUSED_ADD and FUSED_SUB
+    double *data; // the data of the matrix, if op is FUSED_LEAF
+} fused_node;
+
 double rand_double(double low, double high);
 void rand_matrix(matrix *result, unsigned int seed, double low, double high);
 int allocate_matrix(matrix **mat, int rows, int cols);
+int allocate_matrix_uninitialized(matrix **mat, int rows, int cols);
 int allocate_matrix_ref(matrix **mat, matrix *from, int offset, int rows, int cols);
+int allocate_matrix_buffer(matrix **mat, Py_buffer *view, int rows, int cols);
+void free_matrix_data(matrix *mat);
+void free_matrix_struct(matrix *mat);
 void deallocate_matrix(matrix *mat);
+void get_matrix_pool_stats(matrix_pool_stats *stats);
+size_t trim_matrix_pool(size_t keep_bytes);
 double get(matrix *mat, int row, int col);
 void set(matrix *mat, int row, int col, double val);
 void fill_matrix(matrix *mat, double val);
@@ -22,3 +53,4 @@ int mul_matrix(matrix *result, matrix *mat1, matrix *mat2);
 int pow_matrix(matrix *result, matrix *mat, int pow);
 int neg_matrix(matrix *result, matrix *mat);
 int abs_matrix(matrix *result, matrix *mat);
+int eval_fused(matrix *result, fused_node *nodes, int num_nodes);
@@ -1,5 +1,7 @@
 #include "numc.h"
 #include <structmember.h>
+#include <limits.h>
+#include <string.h>
 
 static PyTypeObject Matrix61cType;
 
@@ -86,8 +88,162 @@ static int init_2d(PyObject *self, PyObject *lst) {
     return 0;
 }
 
+/*
+ * LAZY EVALUATION
+ * In lazy mode (see set_lazy), a + b, a - b, -a and abs(a) on matrices of the same shape do not
+ * compute anything. They return a matrix whose `mat` is NULL and that remembers the operation and
+ * its operands instead. The whole chain of pending operations behind a matrix is computed in one
+ * fused pass by eval_fused once its value is needed: by get, to_list, indexing, the buffer
+ * protocol, mul, pow or eval(). Its shape is known without computing anything.
+ * Every pending matrix is kept in a list, and all of them are computed before anything that can
+ * write to a matrix (set, item assignment, in-place operators, out=, buffers), so that
+ * they still see the values their operands had when they were created. Any function that reads
+ * or writes a matrix's data, including Matrix61c_get_value and Matrix61c_set_value below, must
+ * call sync_matrix on it first.
+ * That cannot be guaranteed for data that Python code can write to directly: data numc has
+ * exported through the buffer protocol or __array_interface__, or that from_buffer took from
+ * another object. An expression reading such data is computed as soon as it is made.
+ */
+static int lazy_mode = 0;
+static Matrix61c *lazy_pending = NULL;
+
+/* Whether self is the pending result of a lazy expression */
+static int is_pending(Matrix61c *self) {
+    return self->mat == NULL && self->lazy_op != FUSED_LEAF;
+}
+
+static void unlink_pending(Matrix61c *self) {
+    if (self->lazy_prev != NULL)
+        self->lazy_prev->lazy_next = self->lazy_next;
+    else if (lazy_pending == self)
+        lazy_pending = self->lazy_next;
+    if (self->lazy_next != NULL)
+        self->lazy_next->lazy_prev = self->lazy_prev;
+    self->lazy_prev = NULL;
+    self->lazy_next = NULL;
+}
+
+/* Number of nodes it takes to compute self */
+static int expr_size(PyObject *self) {
+    return is_pending((Matrix61c *)self) ? ((Matrix61c *)self)->lazy_size : 1;
+}
+
+/* Appends the nodes that compute self to `nodes`, returning the index of the last one */
+static int compile_expr(Matrix61c *self, fused_node *nodes, int *num_nodes) {
+    fused_node node = {FUSED_LEAF, -1, -1, NULL};
+    if (is_pending(self)) {
+        node.op = self->lazy_op;
+        node.left = compile_expr((Matrix61c *)self->lazy_operands[0], nodes, num_nodes);
+        if (self->lazy_operands[1] != NULL)
+            node.right = compile_expr((Matrix61c *)self->lazy_operands[1], nodes, num_nodes);
+    } else {
+        node.data = self->mat->data;
+    }
+    nodes[*num_nodes] = node;
+    return (*num_nodes)++;
+}
+
+/* Computes self if it is pending. Return 0 on success, otherwise set a Python error and return -1 */
+static int force(Matrix61c *self) {
+    if (!is_pending(self))
+        return 0;
+    fused_node nodes[FUSED_MAX_NODES];
+    int num_nodes = 0;
+    compile_expr(self, nodes, &num_nodes);
+
+    matrix *result;
+    int rows = PyLong_AsLong(PyTuple_GET_ITEM(self->shape, 0));
+    int cols = PyLong_AsLong(PyTuple_GET_ITEM(self->shape, 1));
+    if (allocate_matrix_uninitialized(&result, rows, cols) != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "Failed to allocate matrix");
+        return -1;
+    }
+    if (eval_fused(result, nodes, num_nodes) != 0) {
+        deallocate_matrix(result);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to evaluate matrix");
+        return -1;
+    }
+    self->mat = result;
+    self->lazy_op = FUSED_LEAF;
+    self->lazy_size = 0;
+    unlink_pending(self);
+    Py_CLEAR(self->lazy_operands[0]);
+    Py_CLEAR(self->lazy_operands[1]);
+    return 0;
+}
+
+/* Computes every pending matrix. Return 0 on success, otherwise set a Python error and return -1 */
+static int flush_pending(void) {
+    while (lazy_pending != NULL) {
+        if (force(lazy_pending) != 0)
+            return -1;
+    }
+    return 0;
+}
+
+/*
+ * Gets self ready for its data to be read, or written to if `write`: computes self if it is
+ * pending, and before a write also every pending matrix, which may read self. Return 0 on success,
+ * otherwise set a Python error and return -1.
+ */
+static int sync_matrix(Matrix61c *self, int write) {
+    return write ? flush_pending() : force(self);
+}
+
+/* The matrix that owns mat's data: mat itself, or the matrix mat is a slice of */
+static matrix *data_owner(matrix *mat) {
+    while (mat->parent != NULL)
+        mat = mat->parent;
+    return mat;
+}
+
+/* Whether self's data can be written to without numc knowing about it */
+static int is_shared(PyObject *self) {
+    matrix *mat = ((Matrix61c *)self)->mat;
+    if (mat == NULL)
+        return 0;
+    mat = data_owner(mat);
+    return mat->base != NULL || mat->exports > 0;
+}
+
+/*
+ * Returns a pending matrix for `op` on a (and b, for binary operations), or NULL on failure. The
+ * matrix is computed right away if an operand's data is shared.
+ */
+static PyObject *make_lazy(int op, PyObject *a, PyObject *b) {
+    /* Keep every expression small enough to compute in one pass by computing its operands first */
+    while (expr_size(a) + (b != NULL ? expr_size(b) : 0) + 1 > FUSED_MAX_NODES) {
+        PyObject *larger = (b != NULL && expr_size(b) > expr_size(a)) ? b : a;
+        if (force((Matrix61c *)larger) != 0)
+            return NULL;
+    }
+    Matrix61c *rv = (Matrix61c *) Matrix61c_new(&Matrix61cType, NULL, NULL);
+    if (rv == NULL)
+        return NULL;
+    rv->lazy_op = op;
+    rv->lazy_size = expr_size(a) + (b != NULL ? expr_size(b) : 0) + 1;
+    Py_INCREF(a);
+    rv->lazy_operands[0] = a;
+    Py_XINCREF(b);
+    rv->lazy_operands[1] = b;
+    rv->shape = ((Matrix61c *)a)->shape;
+    Py_INCREF(rv->shape);
+    rv->lazy_next = lazy_pending;
+    if (lazy_pending != NULL)
+        lazy_pending->lazy_prev = rv;
+    lazy_pending = rv;
+    if ((is_shared(a) || (b != NULL && is_shared(b))) && force(rv) != 0) {
+        Py_DECREF(rv);
+        return NULL;
+    }
+    return (PyObject *)rv;
+}
+
 /* This deallocation function is called when reference count is 0*/
 static void Matrix61c_dealloc(Matrix61c *self) {
+    unlink_pending(self);
+    Py_XDECREF(self->lazy_operands[0]);
+    Py_XDECREF(self->lazy_operands[1]);
     deallocate_matrix(self->mat);
     Py_TYPE(self)->tp_free(self);
 }
@@ -195,6 +351,8 @@ static int Matrix61c_init(PyObject *self, PyObject *args, PyObject *kwds) {
 
 /* List of lists representations for matrices */
 static PyObject *Matrix61c_to_list(Matrix61c *self) {
+    if (sync_matrix(self, 0) != 0)
+        return NULL;
     int rows = self->mat->rows;
     int cols = self->mat->cols;
     PyObject *py_lst = PyList_New(rows);
@@ -223,20 +381,375 @@ static PyObject *Matrix61c_class_to_list(Matrix61c *self, PyObject *args) {
     }
 }
 
+/* Whether a buffer format string describes native doubles */
+static int is_double_format(const char *format) {
+    if (format == NULL)
+        return 0;
+    if (format[0] == '@' || format[0] == '=' || format[0] == (PY_LITTLE_ENDIAN ? '<' : '>'))
+        format++;
+    return strcmp(format, "d") == 0;
+}
+
+/*
+ * from_buffer(buffer[, rows, cols]). Returns a numc.Matrix that shares the memory of `buffer`, which
+ * must be a writable C-contiguous buffer of doubles (e.g. a float64 NumPy array), instead of
+ * copying it. The shape is taken from a 2D buffer unless rows and cols are given.
+ */
+static PyObject *Matrix61c_class_from_buffer(PyObject *self, PyObject *args) {
+    PyObject *obj = NULL;
+    PyObject *rows_obj = NULL;
+    PyObject *cols_obj = NULL;
+    if (!PyArg_UnpackTuple(args, "args", 1, 3, &obj, &rows_obj, &cols_obj) || (rows_obj && !cols_obj)) {
+        PyErr_SetString(PyExc_TypeError, "Invalid arguments");
+        return NULL;
+    }
+    Py_buffer *view = PyMem_Malloc(sizeof(Py_buffer));
+    if (view == NULL)
+        return PyErr_NoMemory();
+    if (PyObject_GetBuffer(obj, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0) {
+        PyMem_Free(view);
+        return NULL;
+    }
+
+    long rows = -1, cols = -1;
+    if (!is_double_format(view->format) || view->itemsize != sizeof(double)) {
+        PyErr_SetString(PyExc_TypeError, "Buffer must contain doubles");
+    } else if (rows_obj) {
+        if (PyLong_Check(rows_obj) && PyLong_Check(cols_obj)) {
+            rows = PyLong_AsLong(rows_obj);
+            cols = PyLong_AsLong(cols_obj);
+        }
+        if (rows <= 0 || cols <= 0 || rows > INT_MAX || cols > INT_MAX || rows * cols * (long)sizeof(double) != view->len)
+            PyErr_SetString(PyExc_TypeError, "Incorrect number of elements in buffer");
+    } else if (view->ndim != 2) {
+        PyErr_SetString(PyExc_TypeError, "Buffer is not 2D, so rows and cols must be given");
+    } else {
+        rows = view->shape[0];
+        cols = view->shape[1];
+        if (rows <= 0 || cols <= 0 || rows > INT_MAX || cols > INT_MAX)
+            PyErr_SetString(PyExc_TypeError, "Buffer dimensions are not valid");
+    }
+    if (PyErr_Occurred()) {
+        PyBuffer_Release(view);
+        PyMem_Free(view);
+        return NULL;
+    }
+
+    matrix *new_mat;
+    if (allocate_matrix_buffer(&new_mat, view, rows, cols) != 0) {
+        PyBuffer_Release(view);
+        PyMem_Free(view);
+        PyErr_SetString(PyExc_RuntimeError, "Failed to allocate matrix");
+        return NULL;
+    }
+    Matrix61c *rv = (Matrix61c *) Matrix61c_new(&Matrix61cType, NULL, NULL);
+    if (rv == NULL) {
+        deallocate_matrix(new_mat);
+        return NULL;
+    }
+    rv->mat = new_mat;
+    rv->shape = Py_BuildValue("(ii)", (int) rows, (int) cols);
+    return (PyObject *)rv;
+}
+
+/*
+ * Operations that numc.Matrix supports, so that the in-place operators and the out= functions
+ * below can share their checks
+ */
+enum { OP_ADD, OP_SUB, OP_MUL, OP_NEG, OP_ABS, OP_POW };
+
+/* Stores the result of `op` on mat1 (and mat2 or pow) to `result`. Return 0 upon success. */
+static int run_op(int op, matrix *result, matrix *mat1, matrix *mat2, int pow) {
+    switch (op) {
+    case OP_ADD:
+        return add_matrix(result, mat1, mat2);
+    case OP_SUB:
+        return sub_matrix(result, mat1, mat2);
+    case OP_MUL:
+        return mul_matrix(result, mat1, mat2);
+    case OP_NEG:
+        return neg_matrix(result, mat1);
+    case OP_ABS:
+        return abs_matrix(result, mat1);
+    case OP_POW:
+        return pow_matrix(result, mat1, pow);
+    }
+    return -1;
+}
+
+/* Whether the data of mat1 and mat2 overlap */
+static int overlaps(matrix *mat1, matrix *mat2) {
+    return mat2 != NULL && mat1->data < mat2->data + (size_t)mat2->rows * mat2->cols &&
+        mat2->data < mat1->data + (size_t)mat1->rows * mat1->cols;
+}
+
+/*
+ * Like run_op, but `out` may share its data with the operands. Element-wise operations can write
+ * straight over an operand whose data is exactly out's. Otherwise, if out shares data with an
+ * operand, the result is computed into a temporary matrix and then copied into out. Either way
+ * out's data stays where it is, so its slices and parent see the result.
+ */
+static int run_op_into(int op, matrix *out, matrix *mat1, matrix *mat2, int pow) {
+    int elementwise = op != OP_MUL && op != OP_POW;
+    int direct = 1;
+    if (overlaps(out, mat1) && !(elementwise && out->data == mat1->data))
+        direct = 0;
+    if (overlaps(out, mat2) && !(elementwise && out->data == mat2->data))
+        direct = 0;
+    if (direct)
+        return run_op(op, out, mat1, mat2, pow);
+
+    matrix *tmp;
+    if (allocate_matrix(&tmp, out->rows, out->cols) != 0)
+        return -1;
+    int failed = run_op(op, tmp, mat1, mat2, pow);
+    if (!failed)
+        memcpy(out->data, tmp->data, (size_t)out->rows * out->cols * sizeof(double));
+    deallocate_matrix(tmp);
+    return failed;
+}
+
+/*
+ * Checks that `op` can be applied to self and other (or pow), and sets rows and cols to the shape
+ * of its result. Otherwise sets a Python error and returns -1.
+ */
+static int result_shape(int op, PyObject *self, PyObject *other, long pow, int *rows, int *cols) {
+    if (!PyObject_TypeCheck(self, &Matrix61cType)) {
+        PyErr_SetString(PyExc_TypeError, "Argument must of type numc.Matrix!");
+        return -1;
+    }
+    if (force((Matrix61c *)self) != 0)
+        return -1;
+    matrix *mat1 = ((Matrix61c *)self)->mat;
+    *rows = mat1->rows;
+    *cols = mat1->cols;
+    if (op == OP_ADD || op == OP_SUB || op == OP_MUL) {
+        if (!PyObject_TypeCheck(other, &Matrix61cType)) {
+            PyErr_SetString(PyExc_TypeError, "Argument must of type numc.Matrix!");
+            return -1;
+        }
+        if (force((Matrix61c *)other) != 0)
+            return -1;
+        matrix *mat2 = ((Matrix61c *)other)->mat;
+        if (op == OP_MUL) {
+            if (mat1->cols != mat2->rows) {
+                PyErr_SetString(PyExc_TypeError, "Matrix dimensions are not valid for multiplication");
+                return -1;
+            }
+            *cols = mat2->cols;
+        } else if (mat1->rows != mat2->rows || mat1->cols != mat2->cols) {
+            PyErr_SetString(PyExc_TypeError, "Matrix dimensions do not match");
+            return -1;
+        }
+    } else if (op == OP_POW) {
+        if (mat1->rows != mat1->cols) {
+            PyErr_SetString(PyExc_TypeError, "Matrix must be square");
+            return -1;
+        }
+        if (pow < 0 || pow > INT_MAX) {
+            PyErr_SetString(PyExc_ValueError, "Power must be a non-negative int");
+            return -1;
+        }
+    }
+    return 0;
+}
+
+/* Returns a new numc.Matrix of the given shape, or NULL with a Python error set */
+static Matrix61c *new_matrix61c(int rows, int cols) {
+    matrix *new_mat;
+    if (allocate_matrix(&new_mat, rows, cols) != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "Failed to allocate matrix");
+        return NULL;
+    }
+    Matrix61c *rv = (Matrix61c *) Matrix61c_new(&Matrix61cType, NULL, NULL);
+    if (rv == NULL) {
+        deallocate_matrix(new_mat);
+        return NULL;
+    }
+    rv->mat = new_mat;
+    rv->shape = Py_BuildValue("(ii)", rows, cols);
+    return rv;
+}
+
+/*
+ * Applies `op` to self and other (or pow), storing the result in `out` and returning it, or in a
+ * new numc.Matrix if out is NULL or None.
+ */
+static PyObject *apply_op(int op, PyObject *self, PyObject *other, long pow, PyObject *out) {
+    int rows, cols;
+    if (out != NULL && out != Py_None && flush_pending() != 0)
+        return NULL;
+    if (result_shape(op, self, other, pow, &rows, &cols) != 0)
+        return NULL;
+    matrix *mat1 = ((Matrix61c *)self)->mat;
+    matrix *mat2 = (op == OP_ADD || op == OP_SUB || op == OP_MUL) ? ((Matrix61c *)other)->mat : NULL;
+
+    if (out == NULL || out == Py_None) {
+        Matrix61c *rv = new_matrix61c(rows, cols);
+        if (rv == NULL)
+            return NULL;
+        if (run_op(op, rv->mat, mat1, mat2, pow) != 0) {
+            Py_DECREF(rv);
+            PyErr_SetString(PyExc_RuntimeError, "Matrix operation failed");
+            return NULL;
+        }
+        return (PyObject *)rv;
+    }
+
+    if (!PyObject_TypeCheck(out, &Matrix61cType)) {
+        PyErr_SetString(PyExc_TypeError, "out must be of type numc.Matrix!");
+        return NULL;
+    }
+    matrix *out_mat = ((Matrix61c *)out)->mat;
+    if (out_mat->rows != rows || out_mat->cols != cols) {
+        PyErr_SetString(PyExc_TypeError, "out does not have the shape of the result");
+        return NULL;
+    }
+    if (run_op_into(op, out_mat, mat1, mat2, pow) != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "Matrix operation failed");
+        return NULL;
+    }
+    Py_INCREF(out);
+    return out;
+}
+
+/* add(a, b, out=None), sub(a, b, out=None) and mul(a, b, out=None) */
+static PyObject *class_binary_op(int op, PyObject *args, PyObject *kwds) {
+    static char *kwlist[] = {"a", "b", "out", NULL};
+    PyObject *a = NULL, *b = NULL, *out = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OO|O", kwlist, &a, &b, &out))
+        return NULL;
+    return apply_op(op, a, b, 0, out);
+}
+
+/* neg(a, out=None) and abs(a, out=None) */
+static PyObject *class_unary_op(int op, PyObject *args, PyObject *kwds) {
+    static char *kwlist[] = {"a", "out", NULL};
+    PyObject *a = NULL, *out = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &a, &out))
+        return NULL;
+    return apply_op(op, a, NULL, 0, out);
+}
+
+static PyObject *Matrix61c_class_add(PyObject *self, PyObject *args, PyObject *kwds) {
+    return class_binary_op(OP_ADD, args, kwds);
+}
+
+static PyObject *Matrix61c_class_sub(PyObject *self, PyObject *args, PyObject *kwds) {
+    return class_binary_op(OP_SUB, args, kwds);
+}
+
+static PyObject *Matrix61c_class_mul(PyObject *self, PyObject *args, PyObject *kwds) {
+    return class_binary_op(OP_MUL, args, kwds);
+}
+
+static PyObject *Matrix61c_class_neg(PyObject *self, PyObject *args, PyObject *kwds) {
+    return class_unary_op(OP_NEG, args, kwds);
+}
+
+static PyObject *Matrix61c_class_abs(PyObject *self, PyObject *args, PyObject *kwds) {
+    return class_unary_op(OP_ABS, args, kwds);
+}
+
+/* pow(a, pow, out=None) */
+static PyObject *Matrix61c_class_pow(PyObject *self, PyObject *args, PyObject *kwds) {
+    static char *kwlist[] = {"a", "pow", "out", NULL};
+    PyObject *a = NULL, *pow = NULL, *out = NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OO|O", kwlist, &a, &pow, &out))
+        return NULL;
+    if (!PyLong_Check(pow)) {
+        PyErr_SetString(PyExc_TypeError, "Power must be an int");
+        return NULL;
+    }
+    long pow_long = PyLong_AsLong(pow);
+    if (pow_long == -1 && PyErr_Occurred())
+        return NULL;
+    return apply_op(OP_POW, a, NULL, pow_long, out);
+}
+
+/* pool_stats(). Returns the statistics of the matrix pool as a dict */
+static PyObject *Matrix61c_class_pool_stats(PyObject *self, PyObject *args) {
+    matrix_pool_stats stats;
+    get_matrix_pool_stats(&stats);
+    return Py_BuildValue("{s:n,s:n,s:n,s:n,s:n,s:n}",
+                         "hits", (Py_ssize_t)stats.hits,
+                         "misses", (Py_ssize_t)stats.misses,
+                         "live_buffers", (Py_ssize_t)stats.live_buffers,
+                         "live_bytes", (Py_ssize_t)stats.live_bytes,
+                         "cached_buffers", (Py_ssize_t)stats.cached_buffers,
+                         "cached_bytes", (Py_ssize_t)stats.cached_bytes);
+}
+
+/* pool_trim(keep_bytes=0). Frees cached buffers until at most keep_bytes are cached, returning how many bytes were freed */
+static PyObject *Matrix61c_class_pool_trim(PyObject *self, PyObject *args) {
+    Py_ssize_t keep_bytes = 0;
+    if (!PyArg_ParseTuple(args, "|n", &keep_bytes))
+        return NULL;
+    if (keep_bytes < 0) {
+        PyErr_SetString(PyExc_ValueError, "keep_bytes must be non-negative");
+        return NULL;
+    }
+    return PyLong_FromSize_t(trim_matrix_pool((size_t)keep_bytes));
+}
+
+/* set_lazy(enabled). Turns lazy evaluation of element-wise operations on or off */
+static PyObject *Matrix61c_class_set_lazy(PyObject *self, PyObject *args) {
+    PyObject *enabled = NULL;
+    if (!PyArg_UnpackTuple(args, "args", 1, 1, &enabled))
+        return NULL;
+    int is_true = PyObject_IsTrue(enabled);
+    if (is_true < 0)
+        return NULL;
+    lazy_mode = is_true;
+    Py_RETURN_NONE;
+}
+
+static PyObject *Matrix61c_class_is_lazy(PyObject *self, PyObject *args) {
+    return PyBool_FromLong(lazy_mode);
+}
+
 /* Add class methods */
 static PyMethodDef Matrix61c_class_methods[] = {
     {"to_list", (PyCFunction)Matrix61c_class_to_list, METH_VARARGS, "Returns a list representation of numc.Matrix"},
+    {"from_buffer", (PyCFunction)Matrix61c_class_from_buffer, METH_VARARGS,
+     "Returns a numc.Matrix that shares the memory of a C-contiguous buffer of doubles"},
+    {"add", (PyCFunction)Matrix61c_class_add, METH_VARARGS | METH_KEYWORDS,
+     "add(a, b, out=None): a + b, stored in out if given"},
+    {"sub", (PyCFunction)Matrix61c_class_sub, METH_VARARGS | METH_KEYWORDS,
+     "sub(a, b, out=None): a - b, stored in out if given"},
+    {"mul", (PyCFunction)Matrix61c_class_mul, METH_VARARGS | METH_KEYWORDS,
+     "mul(a, b, out=None): a * b, stored in out if given"},
+    {"neg", (PyCFunction)Matrix61c_class_neg, METH_VARARGS | METH_KEYWORDS,
+     "neg(a, out=None): -a, stored in out if given"},
+    {"abs", (PyCFunction)Matrix61c_class_abs, METH_VARARGS | METH_KEYWORDS,
+     "abs(a, out=None): abs(a), stored in out if given"},
+    {"pow", (PyCFunction)Matrix61c_class_pow, METH_VARARGS | METH_KEYWORDS,
+     "pow(a, pow, out=None): a ** pow, stored in out if given"},
+    {"set_lazy", (PyCFunction)Matrix61c_class_set_lazy, METH_VARARGS,
+     "set_lazy(enabled): turns lazy, fused evaluation of +, -, neg and abs on or off"},
+    {"is_lazy", (PyCFunction)Matrix61c_class_is_lazy, METH_NOARGS,
+     "Returns whether lazy evaluation is on"},
+    {"pool_stats", (PyCFunction)Matrix61c_class_pool_stats, METH_NOARGS,
+     "Returns the statistics of the matrix pool"},
+    {"pool_trim", (PyCFunction)Matrix61c_class_pool_trim, METH_VARARGS,
+     "pool_trim(keep_bytes=0): frees cached matrix buffers, returning how many bytes were freed"},
     {NULL, NULL, 0, NULL}
 };
 
 /* Matrix61c string representation. For printing purposes. */
 static PyObject *Matrix61c_repr(PyObject *self) {
     PyObject *py_lst = Matrix61c_to_list((Matrix61c *)self);
-    return PyObject_Repr(py_lst);
+    if (py_lst == NULL)
+        return NULL;
+    PyObject *repr = PyObject_Repr(py_lst);
+    Py_DECREF(py_lst);
+    return repr;
 }
 
 /* For __getitem__. (e.g. mat[0]) */
 static PyObject *Matrix61c_subscript(Matrix61c* self, PyObject* key) {
+    if (sync_matrix(self, 0) != 0)
+        return NULL;
     if (!PyLong_Check(key)) {
         PyErr_SetString(PyExc_TypeError, "Key is not valid");
         return NULL;
@@ -263,6 +776,8 @@ static PyObject *Matrix61c_subscript(Matrix61c* self, PyObject* key) {
 
 /* For __setitem__ (e.g. mat[0] = 1) */
 static int Matrix61c_set_subscript(Matrix61c* self, PyObject *key, PyObject *v) {
+    if (sync_matrix(self, 1) != 0)
+        return -1;
     if (!PyLong_Check(key)) {
         PyErr_SetString(PyExc_TypeError, "Key is not valid");
         return -1;
@@ -357,12 +872,121 @@ static PyObject *Matrix61c_pow(Matrix61c *self, PyObject *pow, PyObject *optiona
     /* TODO: YOUR CODE HERE */
 }
 
+/*
+ * The number slots of numc.Matrix. In lazy mode, add, sub, neg and abs return a pending matrix
+ * (see LAZY EVALUATION above). Otherwise, and for multiply and pow, which change shapes, they
+ * compute their operands first and call the functions above, which therefore never see a pending
+ * matrix.
+ */
+static PyObject *binary_slot(int op, PyObject *self, PyObject *args, binaryfunc eager) {
+    if (!PyObject_TypeCheck(self, &Matrix61cType))
+        Py_RETURN_NOTIMPLEMENTED;
+    int is_matrix = PyObject_TypeCheck(args, &Matrix61cType);
+    if (lazy_mode && op != FUSED_LEAF && is_matrix && ((Matrix61c *)self)->shape != NULL &&
+        ((Matrix61c *)args)->shape != NULL) {
+        int same_shape = PyObject_RichCompareBool(((Matrix61c *)self)->shape, ((Matrix61c *)args)->shape, Py_EQ);
+        if (same_shape < 0)
+            return NULL;
+        if (same_shape)
+            return make_lazy(op, self, args);
+    }
+    if (force((Matrix61c *)self) != 0 || (is_matrix && force((Matrix61c *)args) != 0))
+        return NULL;
+    return eager(self, args);
+}
+
+static PyObject *unary_slot(int op, PyObject *self, unaryfunc eager) {
+    if (lazy_mode && ((Matrix61c *)self)->shape != NULL)
+        return make_lazy(op, self, NULL);
+    if (force((Matrix61c *)self) != 0)
+        return NULL;
+    return eager(self);
+}
+
+static PyObject *Matrix61c_add_slot(PyObject *self, PyObject *args) {
+    return binary_slot(FUSED_ADD, self, args, (binaryfunc) Matrix61c_add);
+}
+
+static PyObject *Matrix61c_sub_slot(PyObject *self, PyObject *args) {
+    return binary_slot(FUSED_SUB, self, args, (binaryfunc) Matrix61c_sub);
+}
+
+static PyObject *Matrix61c_multiply_slot(PyObject *self, PyObject *args) {
+    return binary_slot(FUSED_LEAF, self, args, (binaryfunc) Matrix61c_multiply);
+}
+
+static PyObject *Matrix61c_neg_slot(PyObject *self) {
+    return unary_slot(FUSED_NEG, self, (unaryfunc) Matrix61c_neg);
+}
+
+static PyObject *Matrix61c_abs_slot(PyObject *self) {
+    return unary_slot(FUSED_ABS, self, (unaryfunc) Matrix61c_abs);
+}
+
+static PyObject *Matrix61c_pow_slot(PyObject *self, PyObject *pow, PyObject *optional) {
+    if (!PyObject_TypeCheck(self, &Matrix61cType))
+        Py_RETURN_NOTIMPLEMENTED;
+    if (force((Matrix61c *)self) != 0)
+        return NULL;
+    return Matrix61c_pow((Matrix61c *)self, pow, optional);
+}
+
+/*
+ * In-place versions of add, sub, multiply and pow (e.g. a += b). These store the result in self's
+ * existing data rather than allocating a new matrix, so slices of self (or self's parent, if self
+ * is a slice) see the result. Operands they do not support give NotImplemented, so that Python
+ * falls back to the regular operators.
+ */
+static PyObject *Matrix61c_iadd(Matrix61c* self, PyObject* args) {
+    if (!PyObject_TypeCheck(args, &Matrix61cType))
+        Py_RETURN_NOTIMPLEMENTED;
+    return apply_op(OP_ADD, (PyObject *)self, args, 0, (PyObject *)self);
+}
+
+static PyObject *Matrix61c_isub(Matrix61c* self, PyObject* args) {
+    if (!PyObject_TypeCheck(args, &Matrix61cType))
+        Py_RETURN_NOTIMPLEMENTED;
+    return apply_op(OP_SUB, (PyObject *)self, args, 0, (PyObject *)self);
+}
+
+static PyObject *Matrix61c_imultiply(Matrix61c* self, PyObject *args) {
+    if (!PyObject_TypeCheck(args, &Matrix61cType))
+        Py_RETURN_NOTIMPLEMENTED;
+    if (flush_pending() != 0)
+        return NULL;
+    matrix *other = ((Matrix61c *)args)->mat;
+    if (self->mat != NULL && other != NULL && self->mat->cols == other->rows &&
+        other->cols != self->mat->cols) {
+        /* The product does not fit in self, so let Python fall back to Matrix61c_multiply */
+        Py_RETURN_NOTIMPLEMENTED;
+    }
+    return apply_op(OP_MUL, (PyObject *)self, args, 0, (PyObject *)self);
+}
+
+static PyObject *Matrix61c_ipow(Matrix61c *self, PyObject *pow, PyObject *optional) {
+    if (!PyLong_Check(pow))
+        Py_RETURN_NOTIMPLEMENTED;
+    long pow_long = PyLong_AsLong(pow);
+    if (pow_long == -1 && PyErr_Occurred())
+        return NULL;
+    return apply_op(OP_POW, (PyObject *)self, NULL, pow_long, (PyObject *)self);
+}
+
 /*
  * Create a PyNumberMethods struct for overloading operators with all the number methods you have
  * define. You might find this link helpful: https://docs.python.org/3.6/c-api/typeobj.html
  */
 static PyNumberMethods Matrix61c_as_number = {
-    /* TODO: YOUR CODE HERE */
+    .nb_add = (binaryfunc) Matrix61c_add_slot,
+    .nb_subtract = (binaryfunc) Matrix61c_sub_slot,
+    .nb_multiply = (binaryfunc) Matrix61c_multiply_slot,
+    .nb_power = (ternaryfunc) Matrix61c_pow_slot,
+    .nb_negative = (unaryfunc) Matrix61c_neg_slot,
+    .nb_absolute = (unaryfunc) Matrix61c_abs_slot,
+    .nb_inplace_add = (binaryfunc) Matrix61c_iadd,
+    .nb_inplace_subtract = (binaryfunc) Matrix61c_isub,
+    .nb_inplace_multiply = (binaryfunc) Matrix61c_imultiply,
+    .nb_inplace_power = (ternaryfunc) Matrix61c_ipow,
 };
 
 
@@ -370,6 +994,7 @@ static PyNumberMethods Matrix61c_as_number = {
 /*
  * Given a numc.Matrix self, parse `args` to (int) row, (int) col, and (double) val.
  * This function should return None in Python.
+ * Call sync_matrix(self, 1) before changing self (see LAZY EVALUATION above).
  */
 static PyObject *Matrix61c_set_value(Matrix61c *self, PyObject* args) {
     /* TODO: YOUR CODE HERE */
@@ -379,11 +1004,20 @@ static PyObject *Matrix61c_set_value(Matrix61c *self, PyObject* args) {
  * Given a numc.Matrix `self`, parse `args` to (int) row and (int) col.
  * This function should return the value at the `row`th row and `col`th column, which is a Python
  * float.
+ * Call sync_matrix(self, 0) before reading self (see LAZY EVALUATION above).
  */
 static PyObject *Matrix61c_get_value(Matrix61c *self, PyObject* args) {
     /* TODO: YOUR CODE HERE */
 }
 
+/* Computes self now if it is the pending result of a lazy expression, and returns it */
+static PyObject *Matrix61c_eval(Matrix61c *self) {
+    if (sync_matrix(self, 0) != 0)
+        return NULL;
+    Py_INCREF(self);
+    return (PyObject *)self;
+}
+
 /*
  * Create an array of PyMethodDef structs to hold the instance methods.
  * Name the python function corresponding to Matrix61c_get_value as "get" and Matrix61c_set_value
@@ -392,9 +1026,87 @@ static PyObject *Matrix61c_get_value(Matrix61c *self, PyObject* args) {
  */
 static PyMethodDef Matrix61c_methods[] = {
     /* TODO: YOUR CODE HERE */
+    {"eval", (PyCFunction)Matrix61c_eval, METH_NOARGS, "Computes the matrix now if it is the result of a lazy expression"},
     {NULL, NULL, 0, NULL}
 };
 
+/* BUFFER PROTOCOL */
+/*
+ * Exports the matrix's data as a writable 2D C-contiguous buffer of doubles, so that memoryview(mat)
+ * and np.asarray(mat) see the matrix without copying it. The matrix stays alive while the buffer
+ * is in use, and the buffer is counted in the `exports` of the matrix that owns the data until it
+ * is released.
+ */
+static int Matrix61c_getbuffer(Matrix61c *self, Py_buffer *view, int flags) {
+    /* Consumers such as NumPy may write to the buffer even if they did not ask for PyBUF_WRITABLE */
+    if (sync_matrix(self, 1) != 0) {
+        view->obj = NULL;
+        return -1;
+    }
+    matrix *mat = self->mat;
+    if (mat == NULL) {
+        PyErr_SetString(PyExc_BufferError, "Matrix is not initialized");
+        view->obj = NULL;
+        return -1;
+    }
+    self->buffer_shape[0] = mat->rows;
+    self->buffer_shape[1] = mat->cols;
+    self->buffer_strides[0] = mat->cols * sizeof(double);
+    self->buffer_strides[1] = sizeof(double);
+
+    view->obj = (PyObject *)self;
+    Py_INCREF(self);
+    view->buf = mat->data;
+    view->len = (Py_ssize_t)mat->rows * mat->cols * sizeof(double);
+    view->readonly = 0;
+    view->itemsize = sizeof(double);
+    view->format = (flags & PyBUF_FORMAT) ? "d" : NULL;
+    view->ndim = 2;
+    view->shape = (flags & PyBUF_ND) ? self->buffer_shape : NULL;
+    view->strides = (flags & PyBUF_STRIDES) ? self->buffer_strides : NULL;
+    view->suboffsets = NULL;
+    view->internal = NULL;
+    data_owner(mat)->exports++;
+    return 0;
+}
+
+static void Matrix61c_releasebuffer(Matrix61c *self, Py_buffer *view) {
+    data_owner(self->mat)->exports--;
+}
+
+static PyBufferProcs Matrix61c_as_buffer = {
+    (getbufferproc) Matrix61c_getbuffer,
+    (releasebufferproc) Matrix61c_releasebuffer,
+};
+
+/*
+ * For __array_interface__, which NumPy uses to wrap the matrix's data without copying it. Nothing
+ * tells numc when the array is gone, so the data counts as exported for good.
+ */
+static PyObject *Matrix61c_array_interface(Matrix61c *self, void *closure) {
+    /* NumPy may write to the matrix through the interface, as through a buffer */
+    if (sync_matrix(self, 1) != 0)
+        return NULL;
+    matrix *mat = self->mat;
+    if (mat == NULL) {
+        PyErr_SetString(PyExc_BufferError, "Matrix is not initialized");
+        return NULL;
+    }
+    data_owner(mat)->exports++;
+    return Py_BuildValue("{s:(ii),s:s,s:(NO),s:O,s:i}",
+                         "shape", mat->rows, mat->cols,
+                         "typestr", PY_LITTLE_ENDIAN ? "<f8" : ">f8",
+                         "data", PyLong_FromVoidPtr(mat->data), Py_False,
+                         "strides", Py_None,
+                         "version", 3);
+}
+
+static PyGetSetDef Matrix61c_getset[] = {
+    {"__array_interface__", (getter)Matrix61c_array_interface, NULL,
+     "NumPy array interface sharing the matrix's data"},
+    {NULL}  /* Sentinel */
+};
+
 /* INSTANCE ATTRIBUTES*/
 static PyMemberDef Matrix61c_members[] = {
     {"shape", T_OBJECT_EX, offsetof(Matrix61c, shape), 0,
@@ -414,6 +1126,8 @@ static PyTypeObject Matrix61cType = {
     .tp_doc = "numc.Matrix objects",
     .tp_methods = Matrix61c_methods,
     .tp_members = Matrix61c_members,
+    .tp_getset = Matrix61c_getset,
+    .tp_as_buffer = &Matrix61c_as_buffer,
     .tp_as_mapping = &Matrix61c_mapping,
     .tp_init = (initproc)Matrix61c_init,
     .tp_new = Matrix61c_new
@@ -6,10 +6,17 @@
  * It also has the matrix that is being wrapped
  * is of type PyObject
  */
-typedef struct {
+typedef struct Matrix61c {
     PyObject_HEAD
-    matrix* mat;
+    matrix* mat; // NULL while the matrix is the pending result of a lazy expression
     PyObject *shape;
+    Py_ssize_t buffer_shape[2]; // shape and strides handed out by Matrix61c_getbuffer
+    Py_ssize_t buffer_strides[2];
+    int lazy_op; // FUSED_* operation this matrix is the pending result of
+    PyObject *lazy_operands[2]; // the operands of lazy_op
+    int lazy_size; // number of nodes in the pending expression
+    struct Matrix61c *lazy_prev; // neighbours in the list of pending matrices
+    struct Matrix61c *lazy_next;
 } Matrix61c;
 
 /* Function definitions */
@@ -21,6 +28,10 @@ static void Matrix61c_dealloc(Matrix61c *self);
 static PyObject *Matrix61c_new(PyTypeObject *type, PyObject *args, PyObject *kwds);
 static int Matrix61c_init(PyObject *self, PyObject *args, PyObject *kwds);
 static PyObject *Matrix61c_to_list(Matrix61c *self);
+static PyObject *Matrix61c_class_from_buffer(PyObject *self, PyObject *args);
+static int Matrix61c_getbuffer(Matrix61c *self, Py_buffer *view, int flags);
+static void Matrix61c_releasebuffer(Matrix61c *self, Py_buffer *view);
+static PyObject *Matrix61c_array_interface(Matrix61c *self, void *closure);
 static PyObject *Matrix61c_repr(PyObject *self);
 static PyObject *Matrix61c_set_value(Matrix61c *self, PyObject* args);
 static PyObject *Matrix61c_get_value(Matrix61c *self, PyObject* args);
@@ -30,4 +41,15 @@ static PyObject *Matrix61c_multiply(Matrix61c* self, PyObject *args);
 static PyObject *Matrix61c_neg(Matrix61c* self);
 static PyObject *Matrix61c_abs(Matrix61c *self);
 static PyObject *Matrix61c_pow(Matrix61c *self, PyObject *pow, PyObject *optional);
+static PyObject *Matrix61c_add_slot(PyObject *self, PyObject *args);
+static PyObject *Matrix61c_sub_slot(PyObject *self, PyObject *args);
+static PyObject *Matrix61c_multiply_slot(PyObject *self, PyObject *args);
+static PyObject *Matrix61c_neg_slot(PyObject *self);
+static PyObject *Matrix61c_abs_slot(PyObject *self);
+static PyObject *Matrix61c_pow_slot(PyObject *self, PyObject *pow, PyObject *optional);
+static PyObject *Matrix61c_eval(Matrix61c *self);
+static PyObject *Matrix61c_iadd(Matrix61c* self, PyObject* args);
+static PyObject *Matrix61c_isub(Matrix61c* self, PyObject* args);
+static PyObject *Matrix61c_imultiply(Matrix61c* self, PyObject *args);
+static PyObject *Matrix61c_ipow(Matrix61c *self, PyObject *pow, PyObject *optional);
 
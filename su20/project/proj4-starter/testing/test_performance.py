@@ -4,106 +4,208 @@ Make sure you follow these naming conventions: https://docs.pytest.org/en/reorga
 for your new tests/classes/python files or else they might be skipped.
 """
 from utils import *
+import json
+import math
+import os
+import statistics
 import time
+import pytest
 
 """
-- We will test you on your performance on add, sub, abs, neg, mul, and pow, so make sure to test these
-yourself! We will also test your implementation on matrices on different sizes. It is normal if
-your smaller matrices are about the same speed as the naive implementation or even slower.
-- Use time.time(), NOT time.perf_counter() to time your program!
-- DO NOT count the time for initializing matrices into your performance time. Only count the
-time the part where operations are carried out.
-- Please also check for correctness while testing for performance!
-- We provide the structure for test_small_add. All other tests should have similar structures
+- Every benchmark times one of add, sub, abs, neg, mul and pow on numc and on dumbpy, for each of
+a small, medium and large matrix size (see SIZES).
+- On numc, each operation is first run WARMUP times untimed, then timed over REPEATS runs with
+time.perf_counter(). dumbpy is only there to compute the speedup and is slow, so it is timed over
+DUMBPY_REPEATS runs with no warmup. Matrices are initialized before timing starts, so only the
+operation itself is counted.
+- The results of the last timed runs are checked with cmp_dp_nc_matrix.
+- The median and 95th percentile of both implementations and the speedup of numc over dumbpy are
+written to performance_results.json, along with when the benchmark ran and when the numc module
+it ran on was built, so that stale results can be told apart. If performance_baseline.json
+exists, a benchmark fails when its numc median is more than TOLERANCE times the baseline's. To
+make the current build the baseline, copy performance_results.json to performance_baseline.json.
 """
-class TestAddPerformance:
-    def test_small_add(self):
-        # Initialize matrices using rand_dp_nc_matrix
-        # TODO: YOUR CODE HERE
+WARMUP = 2
+REPEATS = 10
+DUMBPY_REPEATS = 1
+TOLERANCE = 1.25
+POWER = 8
 
-        nc_start = time.time()
-        # Carry out numc matrix operations
-        # TODO: YOUR CODE HERE
-        nc_end = time.time()
+script_dir = os.path.dirname(os.path.realpath(__file__))
+results_path = os.path.join(script_dir, "performance_results.json")
+baseline_path = os.path.join(script_dir, "performance_baseline.json")
 
-        dp_start = time.time()
-        # Carry out dumbpy matrix operations
-        # TODO: YOUR CODE HERE
-        dp_end = time.time()
+"""
+The operation each benchmark runs, and how many matrices it takes
+"""
+OPERATIONS = {
+    "add": (lambda a, b: a + b, 2),
+    "sub": (lambda a, b: a - b, 2),
+    "abs": (lambda a: abs(a), 1),
+    "neg": (lambda a: -a, 1),
+    "mul": (lambda a, b: a * b, 2),
+    "pow": (lambda a: a ** POWER, 1),
+}
 
-        # Check for correctness using cmp_dp_nc_matrix and calculate speedup
-        # TODO: YOUR CODE HERE
-        pass
+ELEMENTWISE_SIZES = {"small": (100, 100), "medium": (1000, 1000), "large": (4000, 4000)}
+
+"""
+The (rows, cols) of the matrices for each operation and size
+"""
+SIZES = {
+    "add": ELEMENTWISE_SIZES,
+    "sub": ELEMENTWISE_SIZES,
+    "abs": ELEMENTWISE_SIZES,
+    "neg": ELEMENTWISE_SIZES,
+    "mul": {"small": (16, 16), "medium": (128, 128), "large": (512, 512)},
+    "pow": {"small": (16, 16), "medium": (64, 64), "large": (256, 256)},
+}
+
+def load_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+baseline = load_json(baseline_path)
+results = {}
+
+"""
+When the numc module being benchmarked was built
+"""
+numc_build = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(nc.__file__)))
+
+"""
+Writes the results once every benchmark in this file has run. Results of benchmarks that were
+not run this time (e.g. with -k) are kept from the previous results file
+"""
+@pytest.fixture(scope="module", autouse=True)
+def write_results():
+    yield
+    all_results = load_json(results_path)
+    all_results.update(results)
+    with open(results_path, "w") as f:
+        json.dump(all_results, f, indent=2, sort_keys=True)
+
+"""
+Returns the p-th percentile of times, using the nearest-rank method
+"""
+def percentile(times, p):
+    ordered = sorted(times)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+"""
+Runs op on operands `warmup` times, then `repeats` more times while timing each run. Returns the
+result of the last run and the time each timed run took
+"""
+def time_runs(op, operands, warmup, repeats):
+    for _ in range(warmup):
+        op(*operands)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = op(*operands)
+        times.append(time.perf_counter() - start)
+    return result, times
+
+def summarize(times):
+    return {"median": statistics.median(times), "p95": percentile(times, 95)}
+
+"""
+Benchmarks one operation at one size, records the result and checks it against the baseline
+"""
+def benchmark(name, size):
+    op, num_operands = OPERATIONS[name]
+    rows, cols = SIZES[name][size]
+    dp_mats, nc_mats = [], []
+    for seed in range(num_operands):
+        dp_mat, nc_mat = rand_dp_nc_matrix(rows, cols, seed=seed, rand=True)
+        dp_mats.append(dp_mat)
+        nc_mats.append(nc_mat)
+
+    nc_result, nc_times = time_runs(op, nc_mats, WARMUP, REPEATS)
+    dp_result, dp_times = time_runs(op, dp_mats, 0, DUMBPY_REPEATS)
+    assert cmp_dp_nc_matrix(dp_result, nc_result)
+
+    key = "%s_%s" % (name, size)
+    result = {
+        "shape": [rows, cols],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "build": numc_build,
+        "warmup": WARMUP,
+        "repeats": REPEATS,
+        "dumbpy_repeats": DUMBPY_REPEATS,
+        "numc": summarize(nc_times),
+        "dumbpy": summarize(dp_times),
+    }
+    result["speedup"] = result["dumbpy"]["median"] / result["numc"]["median"]
+    results[key] = result
+    print("%s %dx%d: numc median %.6fs p95 %.6fs, dumbpy median %.6fs p95 %.6fs, speedup %.2fx" % (
+        name, rows, cols, result["numc"]["median"], result["numc"]["p95"],
+        result["dumbpy"]["median"], result["dumbpy"]["p95"], result["speedup"]))
+
+    if key in baseline:
+        limit = baseline[key]["numc"]["median"] * TOLERANCE
+        assert result["numc"]["median"] <= limit, "%s regressed: numc median %.6fs, baseline %.6fs" % (
+            key, result["numc"]["median"], baseline[key]["numc"]["median"])
+
+class TestAddPerformance:
+    def test_small_add(self):
+        benchmark("add", "small")
 
     def test_medium_add(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("add", "medium")
 
     def test_large_add(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("add", "large")
 
 class TestSubPerformance:
     def test_small_sub(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("sub", "small")
 
     def test_medium_sub(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("sub", "medium")
 
     def test_large_sub(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("sub", "large")
 
 class TestAbsPerformance:
     def test_small_abs(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("abs", "small")
 
     def test_medium_abs(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("abs", "medium")
 
     def test_large_abs(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("abs", "large")
 
 class TestNegPerformance:
     def test_small_neg(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("neg", "small")
 
     def test_medium_neg(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("neg", "medium")
 
     def test_large_neg(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("neg", "large")
 
 class TestMulPerformance:
     def test_small_mul(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("mul", "small")
 
     def test_medium_mul(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("mul", "medium")
 
     def test_large_mul(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("mul", "large")
 
 class TestPowPerformance:
     def test_small_pow(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("pow", "small")
 
     def test_medium_pow(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("pow", "medium")
 
     def test_large_pow(self):
-        # TODO: YOUR CODE HERE
-        pass
+        benchmark("pow", "large")
@@ -33,21 +33,77 @@ This function allows a reasonable margin of floating point errors
 def cmp_dp_nc_matrix(dp_mat: dp.Matrix, nc_mat: nc.Matrix):
     return rand_md5(dp_mat) == rand_md5(nc_mat)
 
+"""
+Returns the (row, col) pairs rand_md5 samples from a matrix of the given shape, leaving
+np.random in the same state as drawing them would. The pairs only depend on the shape, so
+they are drawn once per shape
+"""
+sample_cache = {}
+
+def sample_indices(rows, cols):
+    if (rows, cols) not in sample_cache:
+        np.random.seed(1)
+        indices = [(np.random.randint(rows), np.random.randint(cols)) for _ in range(num_samples)]
+        sample_cache[(rows, cols)] = (indices, np.random.get_state())
+    indices, state = sample_cache[(rows, cols)]
+    np.random.set_state(state)
+    return indices
+
+"""
+Returns all entries of mat as a flat float64 array without copying them, or None if mat
+does not support the buffer protocol
+"""
+def matrix_buffer(mat: Union[dp.Matrix, nc.Matrix]):
+    try:
+        view = memoryview(mat)
+    except TypeError:
+        return None
+    return np.asarray(view, dtype=np.float64).reshape(-1)
+
+"""
+Returns all entries of mat in row-major order, fetched in one call where mat allows it
+"""
+def matrix_values(mat: Union[dp.Matrix, nc.Matrix]):
+    data = matrix_buffer(mat)
+    if data is not None:
+        return data
+    if isinstance(mat, nc.Matrix):
+        return [val for row in nc.to_list(mat) for val in row]
+    rows, cols = mat.shape
+    return [mat.get(i, j) for i in range(rows) for j in range(cols)]
+
+"""
+Returns round(val, decimal_places) for every val in values, computed in bulk. Scaling by
+10 ** decimal_places is only inexact by much less than the tolerance below, so np.rint picks
+the same integer as round() unless the scaled value is close to a tie or too large; those few
+are rounded one at a time
+"""
+def round_values(values):
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** decimal_places
+    with np.errstate(all="ignore"):
+        scaled = values * scale
+        rounded = np.rint(scaled) / scale
+        sure = (np.abs(scaled) < 2.0 ** 31) & (np.abs(scaled - np.floor(scaled) - 0.5) > 1e-6)
+    for k in np.flatnonzero(~sure):
+        rounded[k] = round(float(values[k]), decimal_places)
+    return rounded.tolist()
+
 """
 Generate a md5 hash by sampling random elements in nc_mat
 """
 def rand_md5(mat: Union[dp.Matrix, nc.Matrix]):
-    np.random.seed(1)
     rows, cols = mat.shape
-    m = hashlib.md5()
-    total_cnt = mat.shape[0] * mat.shape[1]
+    total_cnt = rows * cols
     if total_cnt < num_samples:
-        for i in range(rows):
-            for j in range(cols):
-                m.update(struct.pack("f", round(mat.get(i, j), decimal_places)))
+        np.random.seed(1)
+        values = matrix_values(mat)
     else:
-        for _ in range(num_samples):
-            i = np.random.randint(rows)
-            j = np.random.randint(cols)
-            m.update(struct.pack("f", round(mat.get(i, j), decimal_places)))
-    return m.digest()
+        indices = sample_indices(rows, cols)
+        data = matrix_buffer(mat)
+        if data is not None:
+            values = data[[i * cols + j for i, j in indices]]
+        else:
+            values = [mat.get(i, j) for i, j in indices]
+    rounded = round_values(values)
+    return hashlib.md5(struct.pack("%df" % len(rounded), *rounded)).digest()
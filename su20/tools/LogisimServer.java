@@ -0,0 +1,201 @@
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.concurrent.LinkedBlockingQueue;
+import java.util.jar.JarFile;
+
+/**
+ * Keeps one JVM alive and runs Logisim simulations on request, so that the
+ * Logisim test scripts (through logisim_server.py) only pay for JVM start-up
+ * once per worker instead of once per circuit.
+ *
+ * Usage: java [-Djava.security.manager=allow] LogisimServer.java logisim-evolution.jar
+ * The flag lets JDK 17 to 23 install a SecurityManager, while JDK 11 and
+ * earlier fail to start with it, so logisim_server.py only passes it to those.
+ *
+ * Once it is ready, the server prints "#ready". It needs a SecurityManager to
+ * stop Logisim's System.exit, which JDK 24 and later no longer allow; there it
+ * prints "!<reason>" and exits instead, and the test scripts go back to
+ * starting Logisim for every circuit.
+ *
+ * Commands are read from stdin, one per line:
+ *   RUN <id> <argc>   followed by argc lines of Logisim arguments
+ *   ABORT <id>        stops run <id> the next time it prints, if it is still going
+ * Each run answers on stdout with one "|<line>" per line Logisim prints, then
+ * "#<exit code>" once the run is over. Since stdin carries the commands,
+ * Logisim itself reads from an empty stdin.
+ *
+ * Every run loads Logisim through a fresh class loader so that no state leaks
+ * from one circuit into the next.
+ */
+public class LogisimServer {
+    private static class ExitException extends SecurityException {
+        final int status;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    private static class AbortException extends RuntimeException {
+        AbortException() {
+            super("aborted");
+        }
+    }
+
+    private static class Request {
+        final String id;
+        final String[] args;
+
+        Request(String id, String[] args) {
+            this.id = id;
+            this.args = args;
+        }
+    }
+
+    private static final PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), false);
+    private static volatile String running = null;
+    private static volatile String aborted = null;
+
+    /**
+     * Frames every line written to it as "|<line>", and throws once the
+     * current run has been aborted to unwind the simulation.
+     */
+    private static class FramedStream extends OutputStream {
+        private final ByteArrayOutputStream line = new ByteArrayOutputStream();
+
+        @Override
+        public void write(int b) {
+            if (running != null && running.equals(aborted)) {
+                throw new AbortException();
+            }
+            if (b == '\n') {
+                flushLine();
+            } else {
+                line.write(b);
+            }
+        }
+
+        void flushLine() {
+            synchronized (out) {
+                out.write('|');
+                out.write(line.toByteArray(), 0, line.size());
+                out.write('\n');
+                out.flush();
+            }
+            line.reset();
+        }
+
+        void finish() {
+            if (line.size() > 0) {
+                flushLine();
+            }
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        URL jar = new File(args[0]).toURI().toURL();
+        String mainClass;
+        try (JarFile jarFile = new JarFile(args[0])) {
+            mainClass = jarFile.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+
+        // Logisim ends simulations with System.exit; turn that into an exception we can catch.
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitException(status);
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            out.print("!this JVM does not allow a SecurityManager (" + e.getMessage() + ")\n");
+            out.flush();
+            System.exit(1);
+        }
+        out.print("#ready\n");
+        out.flush();
+
+        // Read commands on their own thread so that ABORT arrives while a run is going.
+        InputStream commands = System.in;
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        LinkedBlockingQueue<Request> requests = new LinkedBlockingQueue<>();
+        Thread reader = new Thread(() -> {
+            BufferedReader in = new BufferedReader(new InputStreamReader(commands, StandardCharsets.UTF_8));
+            try {
+                String line;
+                while ((line = in.readLine()) != null) {
+                    String[] command = line.trim().split(" ");
+                    if (command[0].equals("ABORT")) {
+                        aborted = command[1];
+                    } else if (command[0].equals("RUN")) {
+                        String[] runArgs = new String[Integer.parseInt(command[2])];
+                        for (int i = 0; i < runArgs.length; i++) {
+                            runArgs[i] = in.readLine();
+                        }
+                        requests.put(new Request(command[1], runArgs));
+                    }
+                }
+            } catch (IOException | InterruptedException e) {
+                // Fall through and shut down.
+            }
+            requests.add(new Request(null, null));
+        });
+        reader.setDaemon(true);
+        reader.start();
+
+        while (true) {
+            Request request = requests.take();
+            if (request.id == null) {
+                break;
+            }
+            int status = run(jar, mainClass, request);
+            synchronized (out) {
+                out.print("#" + status + "\n");
+                out.flush();
+            }
+        }
+        Runtime.getRuntime().halt(0);
+    }
+
+    private static int run(URL jar, String mainClass, Request request) {
+        PrintStream oldOut = System.out;
+        FramedStream framed = new FramedStream();
+        System.setOut(new PrintStream(framed, true));
+        running = request.id;
+        try (URLClassLoader loader = new URLClassLoader(new URL[] {jar}, ClassLoader.getPlatformClassLoader())) {
+            Method main = loader.loadClass(mainClass).getMethod("main", String[].class);
+            main.invoke(null, (Object) request.args);
+            return 0;
+        } catch (InvocationTargetException e) {
+            for (Throwable t = e.getCause(); t != null; t = t.getCause()) {
+                if (t instanceof ExitException) {
+                    return ((ExitException) t).status;
+                }
+                if (t instanceof AbortException) {
+                    return 143;
+                }
+            }
+            e.getCause().printStackTrace();
+            return 1;
+        } catch (ExitException e) {
+            return e.status;
+        } catch (Exception e) {
+            e.printStackTrace();
+            return 1;
+        } finally {
+            running = null;
+            framed.finish();
+            System.setOut(oldOut);
+        }
+    }
+}
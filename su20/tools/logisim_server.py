@@ -0,0 +1,205 @@
+"""
+Client for LogisimServer.java, shared by the Logisim test scripts (lab 5's
+test.py and project 3's test_runner.py) to run many circuits in resident JVMs.
+"""
+
+import itertools
+import os
+import re
+import subprocess
+import threading
+
+server_location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "LogisimServer.java")
+
+JAVA_VERSION_PATTERN = re.compile(r'version "(\d+)(?:\.(\d+))?')
+java_flags = None
+java_flags_lock = threading.Lock()
+
+def java_major_version():
+  """
+  Returns the major version of the java on PATH (8 for "1.8.0"), or None if it cannot tell.
+  """
+  try:
+    proc = subprocess.run(["java", "-version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=30)
+  except (OSError, subprocess.TimeoutExpired):
+    return None
+  match = JAVA_VERSION_PATTERN.search(proc.stdout)
+  if match is None:
+    return None
+  major = int(match.group(1))
+  if major == 1 and match.group(2) is not None:
+    major = int(match.group(2))
+  return major
+
+def server_java_flags():
+  """
+  Returns the flags the LogisimServer JVM needs to install its SecurityManager. Only JDK 17 to 23
+  need (and accept) -Djava.security.manager=allow; JDK 11 fails to start with it.
+  """
+  global java_flags
+  with java_flags_lock:
+    if java_flags is None:
+      version = java_major_version()
+      if version is None:
+        print("Could not tell the Java version from `java -version`, so the Logisim server starts without -Djava.security.manager=allow")
+      elif version < 17:
+        print("Java %d does not take -Djava.security.manager=allow, so the Logisim server starts without it" % version)
+      java_flags = ["-Djava.security.manager=allow"] if version is not None and 17 <= version < 24 else []
+    return java_flags
+
+class ServerUnavailable(Exception):
+  """
+  Raised when a LogisimServer cannot start, e.g. on a JDK without SecurityManager support.
+  """
+
+class LogisimServer():
+  """
+  A resident JVM which runs Logisim simulations one after another (see LogisimServer.java).
+  It runs in `cwd`, like a Logisim process started for a single circuit would.
+  """
+
+  def __init__(self, logisim_location, cwd=None):
+    self.logisim_location = logisim_location
+    self.cwd = cwd
+    self.proc = None
+    self.run_ids = itertools.count()
+
+  def start(self):
+    try:
+      self.proc = subprocess.Popen(["java"] + server_java_flags() + [server_location, self.logisim_location],
+                                   cwd=self.cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    except OSError as e:
+      raise ServerUnavailable(str(e))
+    line = self.proc.stdout.readline()
+    if line != b"#ready\n":
+      self.stop()
+      reason = line.decode("utf-8", "replace").lstrip("!").strip()
+      raise ServerUnavailable(reason or "the JVM exited while starting")
+
+  def stop(self):
+    if self.proc is not None:
+      self.proc.kill()
+      self.proc.wait()
+      self.proc = None
+
+  def running(self):
+    return self.proc is not None and self.proc.poll() is None
+
+  def run(self, circ_path):
+    if not self.running():
+      self.start()
+    run_id = next(self.run_ids)
+    args = ["-tty", "table", circ_path]
+    request = "RUN %d %d\n" % (run_id, len(args)) + "".join(arg + "\n" for arg in args)
+    self.proc.stdin.write(request.encode("utf-8"))
+    self.proc.stdin.flush()
+    return SimulationOutput(self, run_id)
+
+class SimulationOutput():
+  """
+  The output of one simulation on a LogisimServer, read like the stdout of a Logisim process.
+  """
+
+  DRAIN_TIMEOUT = 5
+
+  def __init__(self, server, run_id):
+    self.server = server
+    self.run_id = run_id
+    self.done = False
+
+  def readline(self):
+    if self.done:
+      return b""
+    line = self.server.proc.stdout.readline()
+    if line.startswith(b"|"):
+      return line[1:]
+    # Either the end of run marker, or the server died
+    self.done = True
+    if line == b"":
+      self.server.stop()
+    return b""
+
+  def close(self):
+    """
+    Stops the simulation and skips whatever else it printed.
+    """
+    if self.done:
+      return
+    self.done = True
+    proc = self.server.proc
+    try:
+      proc.stdin.write(b"ABORT %d\n" % self.run_id)
+      proc.stdin.flush()
+    except BrokenPipeError:
+      self.server.stop()
+      return
+    # A simulation which has stopped printing can't be aborted, so give up on the whole JVM
+    timer = threading.Timer(self.DRAIN_TIMEOUT, proc.kill)
+    timer.start()
+    try:
+      while True:
+        line = proc.stdout.readline()
+        if line == b"":
+          self.server.stop()
+          break
+        if line.startswith(b"#"):
+          break
+    finally:
+      timer.cancel()
+
+class LogisimServerPool():
+  """
+  Hands out one started LogisimServer per concurrently running test, at most `size` at a time.
+  A server is only handed out for the working directory it was started in, so a test that needs
+  another one gets a new server, or an idle one restarted there. If servers cannot start on this
+  machine, get says why once and then returns None, and tests should start Logisim themselves.
+  """
+
+  def __init__(self, logisim_location, size):
+    self.logisim_location = logisim_location
+    self.size = size
+    self.idle = []
+    self.busy = 0
+    self.unavailable = False
+    self.lock = threading.Condition()
+
+  def get(self, cwd=None):
+    with self.lock:
+      while not self.unavailable and not self.idle and self.busy + len(self.idle) >= self.size:
+        self.lock.wait()
+      if self.unavailable:
+        return None
+      matching = [server for server in self.idle if server.cwd == cwd]
+      if matching:
+        server = matching[0]
+        self.idle.remove(server)
+      elif self.busy + len(self.idle) < self.size:
+        server = LogisimServer(self.logisim_location, cwd)
+      else:
+        self.idle.pop(0).stop()
+        server = LogisimServer(self.logisim_location, cwd)
+      self.busy += 1
+    try:
+      if not server.running():
+        server.start()
+      return server
+    except ServerUnavailable as e:
+      with self.lock:
+        self.busy -= 1
+        if not self.unavailable:
+          self.unavailable = True
+          print("Could not start a resident Logisim JVM (%s), so each test will start Logisim instead" % e)
+        self.lock.notify_all()
+      return None
+
+  def put(self, server):
+    with self.lock:
+      self.busy -= 1
+      self.idle.append(server)
+      self.lock.notify()
+
+  def close(self):
+    with self.lock:
+      for server in self.idle:
+        server.stop()
+      self.idle = []